@@ -0,0 +1,142 @@
+import json
+import re
+from collections import namedtuple
+from operator import itemgetter
+
+import numpy as np
+import psycopg2.extensions
+
+Vertex = namedtuple("Vertex", ["id", "label", "properties"])
+Edge = namedtuple("Edge", ["id", "label", "start_id", "end_id", "properties"])
+
+
+class Path(list):
+    """Vertices and edges of a path, alternating and starting with a vertex"""
+
+
+# agtype text is JSON plus ::vertex/::edge/::path/::numeric annotations. The annotations are
+# turned into JSON the decoder can see (a NUL can't occur in a Postgres string, so the marks
+# never collide with data); quoted strings are matched first so nothing inside them is touched.
+ANNOTATION = re.compile(r'"(?:[^"\\]|\\.)*"|\}::(vertex|edge)|\]::path|::numeric')
+PATH_MARK = "\0path"
+
+
+def mark_annotation(match):
+    text = match.group(0)
+    if text[0] == '"':
+        return text
+    if text[0] == "}":
+        return f',"\\u0000":"{match.group(1)}"}}'
+    if text[0] == "]":
+        return ',"\\u0000path"]'
+    return ""
+
+
+def make_entity(obj):
+    kind = obj.pop("\0", None)
+    if kind == "vertex":
+        return Vertex(obj["id"], obj["label"], obj["properties"])
+    if kind == "edge":
+        return Edge(obj["id"], obj["label"], obj["start_id"], obj["end_id"], obj["properties"])
+    return obj
+
+
+def make_paths(value):
+    if isinstance(value, list):
+        items = [make_paths(item) for item in value]
+        if items and items[-1] == PATH_MARK:
+            return Path(items[:-1])
+        return items
+    if isinstance(value, dict):
+        return {key: make_paths(item) for key, item in value.items()}
+    return value
+
+
+def decode(text):
+    """agtype text -> int, float, str, bool, None, list, dict, Vertex, Edge or Path"""
+    if text is None:
+        return None
+    if "::" not in text:
+        return json.loads(text)
+    value = json.loads(ANNOTATION.sub(mark_annotation, text), object_hook=make_entity)
+    return make_paths(value) if "]::path" in text else value
+
+
+def cast_agtype(value, cursor):
+    return decode(value)
+
+
+def cast_raw(value, cursor):
+    return value
+
+
+def agtype_oid(cursor):
+    cursor.execute("SELECT 'ag_catalog.agtype'::regtype::oid;")
+    return cursor.fetchone()[0]
+
+
+def register(conn):
+    """Makes conn return agtype columns as Python values instead of their text"""
+    with conn.cursor() as cursor:
+        oid = agtype_oid(cursor)
+    psycopg2.extensions.register_type(psycopg2.extensions.new_type((oid,), "AGTYPE", cast_agtype), conn)
+    conn.agtype_oid = oid
+
+
+def register_raw(cursor):
+    """Keeps agtype columns as text on this cursor only, for the bulk column decoders below"""
+    oid = cursor.connection.agtype_oid
+    psycopg2.extensions.register_type(psycopg2.extensions.new_type((oid,), "AGTYPE_RAW", cast_raw), cursor)
+
+
+def column(rows, index):
+    return list(map(itemgetter(index), rows))
+
+
+def parse_numbers(values, dtype):
+    # One C-level parse of the joined column instead of a Python call per value
+    out = np.fromstring(" ".join(values), dtype=dtype, sep=" ")
+    if len(out) != len(values):
+        raise ValueError(f"Column is not all {np.dtype(dtype).name}")
+    return out
+
+
+def decode_ints(values):
+    """A whole column of agtype integers (ids, counts) -> int64 array"""
+    return parse_numbers(values, np.int64)
+
+
+def decode_floats(values):
+    return parse_numbers(values, np.float64)
+
+
+def decode_strings(values):
+    """A whole column of agtype strings -> list of str
+
+    agtype escapes quotes and newlines inside strings, so the joined column splits back exactly
+    on '"<newline>"'; only the values with escapes in them go through json. A column with a SQL
+    NULL, an agtype null or any other non-string value in it doesn't split into one piece per
+    value and is decoded value by value instead.
+    """
+    if not values:
+        return []
+    if None not in values:
+        joined = "\n".join(values)
+        strings = joined[1:-1].split('"\n"')
+        # Every value is a quoted string only if every boundary between two of them split
+        if joined[0] == '"' and joined[-1] == '"' and len(strings) == len(values):
+            if "\\" not in joined:
+                return strings
+            return [json.loads(f'"{string}"') if "\\" in string else string for string in strings]
+    return [decode(value) for value in values]
+
+
+def to_plain(value):
+    """Vertices, edges and paths as plain dicts/lists, e.g. for json.dumps"""
+    if isinstance(value, (Vertex, Edge)):
+        return {key: to_plain(item) for key, item in value._asdict().items()}
+    if isinstance(value, list):
+        return [to_plain(item) for item in value]
+    if isinstance(value, dict):
+        return {key: to_plain(item) for key, item in value.items()}
+    return value
@@ -0,0 +1,31 @@
+import time
+
+# Session settings of the load connections in bulk mode; a failed bulk load is
+# simply dropped and redone, so losing the last commits on a crash is fine
+BULK_SESSION_SETTINGS = {
+    "synchronous_commit": "off",
+    "maintenance_work_mem": "1GB",
+    "max_parallel_maintenance_workers": "4",
+}
+
+
+def apply_bulk_settings(cursor):
+    for name, value in BULK_SESSION_SETTINGS.items():
+        cursor.execute("SELECT set_config(%s, %s, false);", (name, value))
+    if not cursor.connection.autocommit:
+        cursor.connection.commit()
+
+
+def set_unlogged(cursor, table):
+    """Stops WAL-logging the (still empty) label table for the duration of the load"""
+    cursor.execute(f"ALTER TABLE {table} SET UNLOGGED;")
+
+
+def restore_durability(cursor, tables):
+    """Makes the label tables logged again; done before the indexes are built so they are built only once"""
+    start = time.perf_counter()
+    for table in tables:
+        cursor.execute(f"ALTER TABLE {table} SET LOGGED;")
+    elapsed = time.perf_counter() - start
+    print(f"Label tables are logged again ({elapsed:.1f} s).")
+    return elapsed
@@ -0,0 +1,175 @@
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+import bulk_load
+
+GRAPH_NAME = "iw_graph"
+VERTEX_LABEL = "Category"
+EDGE_LABEL = "has"
+
+# AGE graphids keep the label id in the upper 16 bits and the entry id in the lower 48 bits
+ENTRY_ID_BITS = 48
+
+# Rows serialized per COPY call, bounds the client memory used by the load
+COPY_BATCH_ROWS = 500_000
+
+
+def make_graphids(label_id, entry_ids):
+    return (np.int64(label_id) << ENTRY_ID_BITS) | np.asarray(entry_ids, dtype=np.int64)
+
+
+def get_label_info(cursor, label_name, graph_name=GRAPH_NAME):
+    """(label id, label table, id sequence) of a label, as stored in ag_catalog.ag_label"""
+    cursor.execute("""
+        SELECT l.id, l.relation::text, format('%%s.%%I', g.namespace, l.seq_name)
+        FROM ag_catalog.ag_label l
+        JOIN ag_catalog.ag_graph g ON g.graphid = l.graph
+        WHERE g.name = %s AND l.name = %s;
+    """, (graph_name, label_name))
+    row = cursor.fetchone()
+    if row is None:
+        raise ValueError(f"Label {label_name} does not exist in graph {graph_name}")
+    return row
+
+
+def vertex_properties(nodes_df):
+    # Same keys load_labels_from_file stores from the nodes.csv columns
+    names = nodes_df['name'].map(lambda name: json.dumps(name, ensure_ascii=False))
+    return ('{"id": ' + nodes_df['id'].astype(str) + ', "name": ' + names.astype(object)
+            + ', "popularity": ' + nodes_df['popularity'].astype(str) + '}')
+
+
+def copy_batch(cursor, table, columns, batch_df):
+    buffer = io.StringIO()
+    batch_df.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+def copy_vertices(cursor, nodes_df, batch_rows=COPY_BATCH_ROWS, graph_name=GRAPH_NAME):
+    label_id, table, _ = get_label_info(cursor, VERTEX_LABEL, graph_name)
+    for start in range(0, len(nodes_df), batch_rows):
+        batch = nodes_df.iloc[start:start + batch_rows]
+        copy_batch(cursor, table, ["id", "properties"], pd.DataFrame({
+            'id': make_graphids(label_id, batch['id'].to_numpy()),
+            'properties': vertex_properties(batch).to_numpy(),
+        }))
+
+
+def copy_edges(cursor, edges_df, first_entry_id=1, batch_rows=COPY_BATCH_ROWS, on_batch=None, graph_name=GRAPH_NAME):
+    """Copies edges_df into the edge label table, numbering the edges from first_entry_id"""
+    edge_label_id, table, _ = get_label_info(cursor, EDGE_LABEL, graph_name)
+    vertex_label_id = get_label_info(cursor, VERTEX_LABEL, graph_name)[0]
+    for start in range(0, len(edges_df), batch_rows):
+        batch = edges_df.iloc[start:start + batch_rows]
+        entry_ids = np.arange(first_entry_id + start, first_entry_id + start + len(batch))
+        copy_batch(cursor, table, ["id", "start_id", "end_id", "properties"], pd.DataFrame({
+            'id': make_graphids(edge_label_id, entry_ids),
+            'start_id': make_graphids(vertex_label_id, batch['start_id'].to_numpy()),
+            'end_id': make_graphids(vertex_label_id, batch['end_id'].to_numpy()),
+            'properties': '{}',
+        }))
+        if on_batch:
+            on_batch(len(batch))
+
+
+def partition_bounds(num_rows, num_partitions):
+    """Start/end row of each of num_partitions contiguous, nearly equal partitions"""
+    return np.linspace(0, num_rows, num_partitions + 1).astype(np.int64)
+
+
+def run_partitions(load_partition, num_partitions):
+    """Runs load_partition(i) for every partition on its own thread, re-raising the first failure"""
+    with ThreadPoolExecutor(max_workers=num_partitions) as pool:
+        futures = [pool.submit(load_partition, i) for i in range(num_partitions)]
+        for future in futures:
+            future.result()
+
+
+def copy_edges_parallel(connect, edges_df, workers, graph_name=GRAPH_NAME):
+    """Copies edges_df split into `workers` partitions concurrently, each over its own connection"""
+    bounds = partition_bounds(len(edges_df), workers)
+    bars = [
+        tqdm(total=int(bounds[i + 1] - bounds[i]), desc=f"Edges partition {i}", position=i, unit="rows")
+        for i in range(workers)
+    ]
+
+    def load_partition(i):
+        conn = connect()
+        try:
+            cursor = conn.cursor()
+            copy_edges(cursor, edges_df.iloc[bounds[i]:bounds[i + 1]],
+                       first_entry_id=int(bounds[i]) + 1, on_batch=bars[i].update, graph_name=graph_name)
+            conn.commit()
+        finally:
+            conn.close()
+
+    try:
+        run_partitions(load_partition, workers)
+    finally:
+        for bar in bars:
+            bar.close()
+
+
+def advance_id_sequence(cursor, label_name, last_entry_id, graph_name=GRAPH_NAME):
+    # The label's id default draws from this sequence, so later CREATEs must not reuse loaded ids
+    _, _, seq_name = get_label_info(cursor, label_name, graph_name)
+    cursor.execute("SELECT setval(%s, %s);", (seq_name, max(int(last_entry_id), 1)))
+
+
+def create_graph_labels(cursor, graph_name=GRAPH_NAME):
+    cursor.execute("LOAD 'age';")
+    cursor.execute("SET search_path TO ag_catalog;")
+    cursor.execute("SELECT create_graph(%s);", (graph_name,))
+    cursor.execute("SELECT create_vlabel(%s, %s);", (graph_name, VERTEX_LABEL))
+    cursor.execute("SELECT create_elabel(%s, %s);", (graph_name, EDGE_LABEL))
+
+
+def label_tables(cursor, graph_name=GRAPH_NAME):
+    return [get_label_info(cursor, label, graph_name)[1] for label in (VERTEX_LABEL, EDGE_LABEL)]
+
+
+def copy_graph(connect, nodes_df, edges_df, edge_workers=1, graph_name=GRAPH_NAME, bulk=False):
+    """Creates the graph and streams nodes_df/edges_df into its label tables with COPY FROM STDIN
+
+    `connect` opens a new database connection; with edge_workers > 1 the edges
+    are loaded over that many connections at once. In bulk mode the label tables
+    are left UNLOGGED, bulk_load.restore_durability makes them logged again.
+    """
+    if bulk:
+        plain_connect = connect
+
+        def connect():
+            conn = plain_connect()
+            bulk_load.apply_bulk_settings(conn.cursor())
+            return conn
+
+    conn = connect()
+    try:
+        conn.autocommit = True
+        cursor = conn.cursor()
+        create_graph_labels(cursor, graph_name)
+        if bulk:
+            for table in label_tables(cursor, graph_name):
+                bulk_load.set_unlogged(cursor, table)
+
+        conn.autocommit = False
+        copy_vertices(cursor, nodes_df, graph_name=graph_name)
+        advance_id_sequence(cursor, VERTEX_LABEL, nodes_df['id'].max() if len(nodes_df) else 0, graph_name)
+        conn.commit()
+        print("NODES INSERTED SECCESSFULLY.")
+
+        if edge_workers > 1:
+            copy_edges_parallel(connect, edges_df, edge_workers, graph_name)
+        else:
+            copy_edges(cursor, edges_df, graph_name=graph_name)
+        advance_id_sequence(cursor, EDGE_LABEL, len(edges_df), graph_name)
+        conn.commit()
+        print("EDGES INSERTED SECCESSFULLY.")
+    finally:
+        conn.close()
@@ -1,8 +1,20 @@
+import argparse
+import contextlib
+import csv
+import io
+import json
 import os
 import psycopg2
 import sys
-from math import ceil
-from tqdm import tqdm
+import time
+from collections import namedtuple
+
+import agtype
+
+from thread_executor import run_concurrently
+from graph_client import FETCH_SIZE, GraphClient
+from graph_snapshot import SNAPSHOT_DIR, GraphSnapshot
+from result_cache import MAX_ENTRIES, ResultCache, TeeOutput, bump_generation, read_generation
 
 # Database connection parameters
 DB_PARAMS = {
@@ -21,87 +33,341 @@ def connect_to_db():
         print(f"Error connecting to database: {e}")
         sys.exit(1)
 
-def run_apache_age_query(query):
-    conn = connect_to_db()
-    conn.autocommit = True
-    cursor = conn.cursor()
+# Shared by all tasks, created on the first query
+graph_client = None
+
+# Queries that failed so far; a task output with errors in it is not cached
+failed_queries = 0
+
+def get_graph_client():
+    global graph_client
+    if graph_client is None:
+        try:
+            graph_client = GraphClient(DB_PARAMS)
+        except Exception as e:
+            print(f"Error connecting to database: {e}")
+            sys.exit(1)
+    return graph_client
+
+def run_apache_age_query(query, raw=False, params=None):
+    global failed_queries
     try:
-        cursor.execute("LOAD 'age';")
-        cursor.execute("SET search_path TO ag_catalog;")
-        cursor.execute(query)
-        result = cursor.fetchall()
-        return result
+        return get_graph_client().query(query, params, raw=raw)
     except psycopg2.Error as e:
+        failed_queries += 1
+        print(f"Database error: {e}")
+        return []
+
+# list prints the whole result as one Python list, ndjson/csv stream it row by row
+output_format = "list"
+fetch_size = FETCH_SIZE
+
+# Independent queries of one task (pages, path lengths, batches) run this many at a time
+concurrency = 4
+
+def run_queries_concurrently(calls, desc=None):
+    """Runs every (query function, *args) of calls at once and returns the results in order"""
+    return run_concurrently(get_graph_client(), calls, concurrency, desc)
+
+def stream_apache_age_query(query, params=None):
+    global failed_queries
+    try:
+        yield from get_graph_client().stream(query, params, fetch_size=fetch_size)
+    except psycopg2.Error as e:
+        failed_queries += 1
+        print(f"Database error: {e}", file=sys.stderr)
+
+def agtype_value(value):
+    # agtype columns arrive decoded, vertices/edges/paths are written as plain objects
+    return agtype.to_plain(value)
+
+def write_rows(rows):
+    if output_format == "csv":
+        writer = csv.writer(sys.stdout)
+        for i, row in enumerate(rows):
+            if i == 0:
+                writer.writerow(row._fields)
+            writer.writerow([agtype_value(value) for value in row])
+    else:
+        for row in rows:
+            print(json.dumps({name: agtype_value(value) for name, value in zip(row._fields, row)}, ensure_ascii=False))
+
+def print_query_result(query, params=None):
+    if output_format == "list":
+        print(query)
+        print(run_apache_age_query(query, params=params))
+    else:
+        write_rows(stream_apache_age_query(query, params))
+
+def run_cypher(name, statement, args):
+    global failed_queries
+    try:
+        return get_graph_client().cypher(name, statement, args)
+    except psycopg2.Error as e:
+        failed_queries += 1
         print(f"Database error: {e}")
         return []
-    finally:
-        conn.close()
+
+def stream_cypher(name, statement, args):
+    global failed_queries
+    try:
+        yield from get_graph_client().stream_cypher(name, statement, args, fetch_size=fetch_size)
+    except psycopg2.Error as e:
+        failed_queries += 1
+        print(f"Database error: {e}", file=sys.stderr)
+
+def print_cypher_result(name, statement, args):
+    """Runs a prepared task statement; args are passed as the cypher parameter map, never spliced into the text"""
+    if output_format == "list":
+        print(statement)
+        print(args)
+        print(run_cypher(name, statement, args))
+    else:
+        write_rows(stream_cypher(name, statement, args))
 
 def task_1(node_name):
     """1. znajduje wszystkie dzieci danego wezla"""
-    query = f"""
+    query = """
         SELECT * FROM cypher('iw_graph', $$
-            MATCH (n {{name: \'{node_name}\'}})-[e]->(child)
+            MATCH (n)-[e]->(child)
+            WHERE n.name = $node_name
             RETURN child.name
-        $$) AS result(n agtype);
+        $$, $1) AS result(n agtype);
     """
-    print(query)
-    print(run_apache_age_query(query))
+    print_cypher_result("task_1", query, {"node_name": node_name})
 
 def task_2(node_name):
     """2. zlicza wszystkie dzieci danego wezla"""
-    query = f"""
+    query = """
         SELECT * FROM cypher('iw_graph', $$
-            MATCH (n {{name: \'{node_name}\'}})-[e]->(child)
+            MATCH (n)-[e]->(child)
+            WHERE n.name = $node_name
             RETURN COUNT(child) AS child_count
-        $$) AS result(child_count agtype);
+        $$, $1) AS result(child_count agtype);
     """
-    print(query)
-    print(run_apache_age_query(query))
+    print_cypher_result("task_2", query, {"node_name": node_name})
 
 def task_3(node_name):
     """3. znajduje wszystkie wnuki danego wezla"""
-    query = f"""
+    query = """
         SELECT * FROM cypher('iw_graph', $$
-            MATCH (n {{name: \'{node_name}\'}})-[e]->(child)-[e2]->(grandchild)
+            MATCH (n)-[e]->(child)-[e2]->(grandchild)
+            WHERE n.name = $node_name
             RETURN grandchild.name
-        $$) AS result(name agtype);
+        $$, $1) AS result(name agtype);
     """
-    print(query)
-    print(run_apache_age_query(query))
+    print_cypher_result("task_3", query, {"node_name": node_name})
 
 def task_4(node_name):
     """4. znajduje wszystkich rodziców danego wezla"""
-    query = f"""
+    query = """
         SELECT * FROM cypher('iw_graph', $$
-            MATCH (parent)-[e]->(n {{name: \'{node_name}\'}})
+            MATCH (parent)-[e]->(n)
+            WHERE n.name = $node_name
             RETURN parent.name
-        $$) AS result(name agtype);
+        $$, $1) AS result(name agtype);
     """
-    print(query)
-    print(run_apache_age_query(query))
+    print_cypher_result("task_4", query, {"node_name": node_name})
 
 def task_5(node_name):
     """5. zlicza wszystkich rodziców danego wezla"""
-    query = f"""
+    query = """
         SELECT * FROM cypher('iw_graph', $$
-            MATCH (parent)-[e]->(n {{name: \'{node_name}\'}})
+            MATCH (parent)-[e]->(n)
+            WHERE n.name = $node_name
             RETURN COUNT(parent) AS parent_count
-        $$) AS result(parent_count int);
+        $$, $1) AS result(parent_count int);
     """
-    print(query)
-    print(run_apache_age_query(query))
+    print_cypher_result("task_5", query, {"node_name": node_name})
 
 def task_6(node_name):
     """6. znajduje wszystkich dziadków danego wezla"""
-    query = f"""
+    query = """
         SELECT * FROM cypher('iw_graph', $$
-            MATCH (grandparent)-[e]->(parent)-[e2]->(n {{name: \'{node_name}\'}})
+            MATCH (grandparent)-[e]->(parent)-[e2]->(n)
+            WHERE n.name = $node_name
             RETURN grandparent.name
-        $$) AS result(name agtype);
+        $$, $1) AS result(name agtype);
     """
-    print(query)
-    print(run_apache_age_query(query))
+    print_cypher_result("task_6", query, {"node_name": node_name})
+
+# Batched tasks 1-6: (pattern with the input node as n, aggregate, result column)
+BATCH_TASKS = {
+    1: ("(n)-[e]->(child)", "collect(child.name)", "children"),
+    2: ("(n)-[e]->(child)", "COUNT(child)", "child_count"),
+    3: ("(n)-[e]->(child)-[e2]->(grandchild)", "collect(grandchild.name)", "grandchildren"),
+    4: ("(parent)-[e]->(n)", "collect(parent.name)", "parents"),
+    5: ("(parent)-[e]->(n)", "COUNT(parent)", "parent_count"),
+    6: ("(grandparent)-[e]->(parent)-[e2]->(n)", "collect(grandparent.name)", "grandparents"),
+}
+
+# Names sent in one parameter list
+BATCH_SIZE = 1000
+
+def batch_task(task_number, node_names):
+    """Tasks 1-6 for many nodes: every BATCH_SIZE names are resolved by one query, one row per input name"""
+    pattern, aggregate, column = BATCH_TASKS[task_number]
+    query = f"""
+        SELECT * FROM cypher('iw_graph', $$
+            UNWIND $node_names AS node_name
+            OPTIONAL MATCH {pattern}
+            WHERE n.name = node_name
+            RETURN node_name, {aggregate}
+        $$, $1) AS result(node_name agtype, {column} agtype);
+    """
+    node_names = list(dict.fromkeys(node_names))
+    batches = [{"node_names": node_names[i:i + BATCH_SIZE]} for i in range(0, len(node_names), BATCH_SIZE)]
+    if output_format != "list":
+        for args in batches:
+            write_rows(stream_cypher(f"task_{task_number}_batch", query, args))
+        return
+
+    results = {}
+    calls = [(run_cypher, f"task_{task_number}_batch", query, args) for args in batches]
+    for rows in run_queries_concurrently(calls, "Batches"):
+        for node_name, value in rows:
+            results[agtype_value(node_name)] = agtype_value(value)
+    print(results)
+
+# Tasks 1-6 answered in-process from the memory-mapped snapshot (graph_snapshot.py):
+# (result for the vertices of the input name, result column)
+SNAPSHOT_TASKS = {
+    1: (lambda snapshot, nodes: snapshot.names(snapshot.children_of(nodes)), "n"),
+    2: (lambda snapshot, nodes: len(snapshot.children_of(nodes)), "child_count"),
+    3: (lambda snapshot, nodes: snapshot.names(snapshot.children_of(snapshot.children_of(nodes))), "name"),
+    4: (lambda snapshot, nodes: snapshot.names(snapshot.parents_of(nodes)), "name"),
+    5: (lambda snapshot, nodes: len(snapshot.parents_of(nodes)), "parent_count"),
+    6: (lambda snapshot, nodes: snapshot.names(snapshot.parents_of(snapshot.parents_of(nodes))), "name"),
+}
+
+# Loaded on the first snapshot task
+graph_snapshot = None
+snapshot_path = SNAPSHOT_DIR
+
+def get_graph_snapshot():
+    """The snapshot, refused when it was exported from an older generation of the graph"""
+    global graph_snapshot
+    if graph_snapshot is None:
+        try:
+            snapshot = GraphSnapshot(snapshot_path)
+        except OSError as e:
+            print(f"Error loading the graph snapshot: {e}. Export it with python graph_snapshot.py")
+            sys.exit(1)
+        current = graph_generation()
+        if snapshot.generation != current:
+            print(f"The graph snapshot is of generation {snapshot.generation}, the graph is at {current}. "
+                  f"Export it again with python graph_snapshot.py")
+            sys.exit(1)
+        graph_snapshot = snapshot
+    return graph_snapshot
+
+def print_rows(columns, rows):
+    """Rows computed in-process, printed like the rows of a query"""
+    if output_format == "list":
+        print(list(rows))
+        return
+    Row = namedtuple("Row", columns)
+    write_rows(Row(*row) for row in rows)
+
+def snapshot_task(task_number, node_names):
+    """Tasks 1-6 from the snapshot; several names give one row per input name, like batch_task"""
+    snapshot = get_graph_snapshot()
+    lookup, column = SNAPSHOT_TASKS[task_number]
+    if len(node_names) == 1:
+        value = lookup(snapshot, snapshot.find(node_names[0]))
+        print_rows([column], [(value,)] if isinstance(value, int) else [(name,) for name in value])
+        return
+    results = {name: lookup(snapshot, snapshot.find(name)) for name in dict.fromkeys(node_names)}
+    if output_format == "list":
+        print(results)
+    else:
+        print_rows(["node_name", BATCH_TASKS[task_number][2]], results.items())
+
+def read_names(path):
+    with (sys.stdin if path == "-" else open(path, encoding="utf-8")) as f:
+        return [line.rstrip("\n") for line in f if line.strip()]
+
+# Nodes per page of the full-graph scans (tasks 8, 9, 11), best by tests
+PAGE_SIZE = 500000
+
+def keyset_pages(label_table='iw_graph."Category"', page_size=PAGE_SIZE):
+    """(lower, upper] graphid ranges of page_size nodes each, covering label_table in id order
+
+    Every boundary is found by an index scan that starts at the previous boundary
+    (WHERE id > last ORDER BY id), so a page costs the same wherever it is in the graph;
+    SKIP had to walk over all the rows before the page. The last range is open (upper None).
+    """
+    query = f"""
+        SELECT id::text FROM {label_table}
+        WHERE id > %s::text::ag_catalog.graphid
+        ORDER BY id
+        OFFSET %s LIMIT 1;
+    """
+    global failed_queries
+    try:
+        with get_graph_client().connection() as conn:
+            with conn.cursor() as cursor:
+                def next_boundary(lower_id):
+                    cursor.execute(query, (str(lower_id), page_size - 1))
+                    row = cursor.fetchone()
+                    return None if row is None else int(row[0])
+                return page_ranges(next_boundary)
+    except psycopg2.Error as e:
+        failed_queries += 1
+        print(f"Database error: {e}")
+        return []
+
+def page_ranges(next_boundary):
+    """(lower, upper] ranges chained from next_boundary(lower), the last id of the page above lower
+    or None when the page is not full; the first range starts at 0 and the last one is open"""
+    pages = []
+    lower_id = 0
+    while True:
+        upper_id = next_boundary(lower_id)
+        pages.append((lower_id, upper_id))
+        if upper_id is None:
+            return pages
+        lower_id = upper_id
+
+def id_range(column, lower_id, upper_id):
+    """(SQL predicate, parameters) selecting the rows of one keyset page by a graphid column
+
+    The range is compared on the column itself, so the btree on it serves the page; a Cypher
+    `id(n) > ...` is evaluated on every vertex after it is built and reads the whole label table.
+    """
+    if upper_id is None:
+        return f"{column} > %s::text::ag_catalog.graphid", (str(lower_id),)
+    return (f"{column} > %s::text::ag_catalog.graphid AND {column} <= %s::text::ag_catalog.graphid",
+            (str(lower_id), str(upper_id)))
+
+# Nodes of one page without inbound edges (tasks 8, 9)
+ROOTS_PAGE_QUERY = """
+    SELECT c.id::text AS no_inbound_id
+    FROM iw_graph."Category" c
+    /* Step 1: the nodes of the page, a graphid range found by keyset_pages */
+    WHERE {page}
+    /* Step 2: keep only those with zero inbound edges */
+    AND NOT EXISTS (SELECT 1 FROM iw_graph.has h WHERE h.end_id = c.id);
+"""
+
+# Nodes of one page with exactly one child (task 11)
+ONE_CHILD_PAGE_QUERY = """
+    SELECT h.start_id::text AS node_id
+    FROM iw_graph.has h
+    /* Step 1: the edges out of the nodes of the page, a graphid range found by keyset_pages */
+    WHERE {page}
+    /* Step 2: keep the nodes with a single one */
+    GROUP BY h.start_id
+    HAVING COUNT(*) = 1;
+"""
+
+def page_calls(page_query, column):
+    """One (run_apache_age_query, query, raw, params) call per keyset page of page_query"""
+    calls = []
+    for lower_id, upper_id in keyset_pages():
+        predicate, params = id_range(column, lower_id, upper_id)
+        calls.append((run_apache_age_query, page_query.format(page=predicate), True, params))
+    return calls
 
 def task_7():
     """7. liczy, ile jest wezlów o unikatowych nazwach"""
@@ -112,61 +378,17 @@ def task_7():
             RETURN DISTINCT n.name
         $$) AS result(name agtype);
     """
-    print(query)
-    print(run_apache_age_query(query))
+    print_query_result(query)
 
 def task_8():
-    query_total = """
-        SELECT total_n
-        FROM cypher('iw_graph', $$
-            MATCH (n)
-            RETURN COUNT(n) AS total_n
-        $$) AS (total_n agtype);
-    """
-    result_total = run_apache_age_query(query_total)
-    total_nodes = int(str(result_total[0][0]).strip('"'))
-    
-    PAGE_SIZE = 500000  # best by tests 
-    num_pages = ceil(total_nodes / PAGE_SIZE)
-
     no_inbound_ids = []
 
-    current_offset = 0
-
-    for _ in tqdm(range(num_pages), desc="Retrieving & checking node pages"):
-        query_page = f"""
-            SELECT no_inbound_id
-            FROM cypher('iw_graph', $$
-                /* Step 1: Match all nodes */
-                MATCH (n)
-
-                /* Step 2: Transition to WITH so we can apply ORDER, SKIP, LIMIT */
-                WITH n
-                ORDER BY id(n)
-                SKIP {current_offset}
-                LIMIT {PAGE_SIZE}
-
-                /* Step 3: Collect them into a list for optional match */
-                WITH collect(n) AS page_nodes
-
-                /* Step 4: UNWIND and do OPTIONAL MATCH to check inbound edges */
-                UNWIND page_nodes AS candidate
-                OPTIONAL MATCH (m)-[r]->(candidate)
-                WITH candidate, COUNT(m) AS inbound_count
-
-                /* Step 5: Keep only those with zero inbound edges */
-                WHERE inbound_count = 0
-                RETURN id(candidate) AS no_inbound_id
-            $$) AS (no_inbound_id agtype);
-        """
-
-        page_result = run_apache_age_query(query_page)
-
-        for row in page_result:
-            raw_str = str(row[0]).strip('"')
-            no_inbound_ids.append(int(raw_str))
+    page_queries = page_calls(ROOTS_PAGE_QUERY, "c.id")
 
-        current_offset += PAGE_SIZE
+    # The pages don't depend on each other, so they are fetched concurrently
+    for page_result in run_queries_concurrently(page_queries, "Retrieving & checking node pages"):
+        ids = agtype.column(page_result, 0)
+        no_inbound_ids.extend(agtype.decode_ints(ids).tolist())
 
     name_chunk_size = 500000
     final_named = []
@@ -175,7 +397,8 @@ def task_8():
         for i in range(0, len(seq), size):
             yield seq[i:i+size]
 
-    for sub_ids in tqdm(list(chunker(no_inbound_ids, name_chunk_size)), desc="Retrieving names"):
+    name_queries = []
+    for sub_ids in chunker(no_inbound_ids, name_chunk_size):
         id_list_str = ", ".join(str(x) for x in sub_ids)
         query_names = f"""
             SELECT node_id, node_name
@@ -185,68 +408,27 @@ def task_8():
                 RETURN id(n) AS node_id, n.name AS node_name
             $$) AS (node_id agtype, node_name agtype);
         """
-        sub_result = run_apache_age_query(query_names)
+        if output_format != "list":
+            write_rows(stream_apache_age_query(query_names))
+            continue
+        name_queries.append((run_apache_age_query, query_names, True))
 
-        for row in sub_result:
-            raw_id = str(row[0]).strip('"')
-            raw_name = str(row[1]).strip('"')
-            final_named.append((int(raw_id), raw_name))
+    for sub_result in run_queries_concurrently(name_queries, "Retrieving names"):
+        ids = agtype.decode_ints(agtype.column(sub_result, 0)).tolist()
+        final_named.extend(zip(ids, agtype.decode_strings(agtype.column(sub_result, 1))))
 
     for nid, nm in final_named:
         print(f" - Node ID={nid}, name={nm}")
 
 def task_9():
-    query_total = """
-        SELECT total_n
-        FROM cypher('iw_graph', $$
-            MATCH (n)
-            RETURN COUNT(n) AS total_n
-        $$) AS (total_n agtype);
-    """
-    result_total = run_apache_age_query(query_total)
-    total_nodes = int(str(result_total[0][0]).strip('"'))
-    
-    PAGE_SIZE = 500000  # bests by tests 
-    num_pages = ceil(total_nodes / PAGE_SIZE)
-
     no_inbound_ids = []
 
-    current_offset = 0
-
-    for _ in tqdm(range(num_pages), desc="Retrieving & checking node pages"):
-        query_page = f"""
-            SELECT no_inbound_id
-            FROM cypher('iw_graph', $$
-                /* Step 1: Match all nodes */
-                MATCH (n)
-
-                /* Step 2: Transition to WITH so we can apply ORDER, SKIP, LIMIT */
-                WITH n
-                ORDER BY id(n)
-                SKIP {current_offset}
-                LIMIT {PAGE_SIZE}
-
-                /* Step 3: Collect them into a list for optional match */
-                WITH collect(n) AS page_nodes
-
-                /* Step 4: UNWIND and do OPTIONAL MATCH to check inbound edges */
-                UNWIND page_nodes AS candidate
-                OPTIONAL MATCH (m)-[r]->(candidate)
-                WITH candidate, COUNT(m) AS inbound_count
-
-                /* Step 5: Keep only those with zero inbound edges */
-                WHERE inbound_count = 0
-                RETURN id(candidate) AS no_inbound_id
-            $$) AS (no_inbound_id agtype);
-        """
-
-        page_result = run_apache_age_query(query_page)
-
-        for row in page_result:
-            raw_str = str(row[0]).strip('"')
-            no_inbound_ids.append(int(raw_str))
+    page_queries = page_calls(ROOTS_PAGE_QUERY, "c.id")
 
-        current_offset += PAGE_SIZE
+    # The pages don't depend on each other, so they are fetched concurrently
+    for page_result in run_queries_concurrently(page_queries, "Retrieving & checking node pages"):
+        ids = agtype.column(page_result, 0)
+        no_inbound_ids.extend(agtype.decode_ints(ids).tolist())
 
     name_chunk_size = 500000
     final_named = []
@@ -255,7 +437,8 @@ def task_9():
         for i in range(0, len(seq), size):
             yield seq[i:i+size]
 
-    for sub_ids in tqdm(list(chunker(no_inbound_ids, name_chunk_size)), desc="Retrieving names"):
+    name_queries = []
+    for sub_ids in chunker(no_inbound_ids, name_chunk_size):
         id_list_str = ", ".join(str(x) for x in sub_ids)
         query_names = f"""
             SELECT node_id, node_name
@@ -265,12 +448,11 @@ def task_9():
                 RETURN id(n) AS node_id, n.name AS node_name
             $$) AS (node_id agtype, node_name agtype);
         """
-        sub_result = run_apache_age_query(query_names)
+        name_queries.append((run_apache_age_query, query_names, True))
 
-        for row in sub_result:
-            raw_id = str(row[0]).strip('"')
-            raw_name = str(row[1]).strip('"')
-            final_named.append((int(raw_id), raw_name))
+    for sub_result in run_queries_concurrently(name_queries, "Retrieving names"):
+        ids = agtype.decode_ints(agtype.column(sub_result, 0)).tolist()
+        final_named.extend(zip(ids, agtype.decode_strings(agtype.column(sub_result, 1))))
 
     print(f"\nTotal {len(final_named)} such nodes.\n")
 
@@ -288,49 +470,17 @@ def task_10():
         SELECT c.properties, a.num_childs 
         FROM aggregated_data a LEFT JOIN iw_graph."Category" c ON a.start_id = c.id;
     """
-    print(query)
-    print(run_apache_age_query(query))
+    print_query_result(query)
 
 def task_11():
-    query_total = """
-        SELECT total_n
-        FROM cypher('iw_graph', $$
-            MATCH (n:Category)
-            RETURN COUNT(n) AS total_n
-        $$) AS (total_n agtype);
-    """
-    result_total = run_apache_age_query(query_total)
-    total_nodes = int(str(result_total[0][0]).strip('"'))
-    
-    PAGE_SIZE = 500000 # best by tests 
-    num_pages = ceil(total_nodes / PAGE_SIZE)
-
     one_child_ids = []
-    current_offset = 0
 
-    for _ in tqdm(range(num_pages), desc="Retrieving & checking Category node pages"):
-        query_page = f"""
-            SELECT node_id
-            FROM cypher('iw_graph', $$
-                MATCH (n:Category)
-                WITH n
-                ORDER BY id(n)
-                SKIP {current_offset}
-                LIMIT {PAGE_SIZE}
-                MATCH (n)-[:has]->(c)
-                WITH n, COUNT(c) AS num_childs
-                WHERE num_childs = 1
-                RETURN id(n) AS node_id
-            $$) AS (node_id agtype);
-        """
-
-        page_result = run_apache_age_query(query_page)
+    page_queries = page_calls(ONE_CHILD_PAGE_QUERY, "h.start_id")
 
-        for row in page_result:
-            raw_str = str(row[0]).strip('"')
-            one_child_ids.append(int(raw_str))
-
-        current_offset += PAGE_SIZE
+    # The pages don't depend on each other, so they are fetched concurrently
+    for page_result in run_queries_concurrently(page_queries, "Retrieving & checking Category node pages"):
+        ids = agtype.column(page_result, 0)
+        one_child_ids.extend(agtype.decode_ints(ids).tolist())
 
     name_chunk_size = 500000
     final_named = []
@@ -339,7 +489,8 @@ def task_11():
         for i in range(0, len(seq), size):
             yield seq[i:i+size]
 
-    for sub_ids in tqdm(list(chunker(one_child_ids, name_chunk_size)), desc="Retrieving names"):
+    name_queries = []
+    for sub_ids in chunker(one_child_ids, name_chunk_size):
         if not sub_ids:
             continue
         id_list_str = ", ".join(str(x) for x in sub_ids)
@@ -351,66 +502,218 @@ def task_11():
                 RETURN id(n) AS node_id, n.name AS node_name
             $$) AS (node_id agtype, node_name agtype);
         """
-        sub_result = run_apache_age_query(query_names)
+        if output_format != "list":
+            write_rows(stream_apache_age_query(query_names))
+            continue
+        name_queries.append((run_apache_age_query, query_names, True))
 
-        for row in sub_result:
-            raw_id = str(row[0]).strip('"')
-            raw_name = str(row[1]).strip('"')
-            final_named.append((int(raw_id), raw_name))
+    for sub_result in run_queries_concurrently(name_queries, "Retrieving names"):
+        ids = agtype.decode_ints(agtype.column(sub_result, 0)).tolist()
+        final_named.extend(zip(ids, agtype.decode_strings(agtype.column(sub_result, 1))))
 
     for nid, nm in final_named:
         print(f" - Node ID={nid}, name={nm}")
 
     # print(len(final_named))
 
+# Set-based SQL forms over the label tables of the scan tasks; they print the same output as
+# the paged tasks, but read the tables in a single pass instead of one keyset page at a time
+NAME_EXPR = """ag_catalog.agtype_access_operator(VARIADIC ARRAY[c.properties, '"name"'::ag_catalog.agtype])"""
+
+ROOTS_QUERY = f"""
+    SELECT c.id::text::bigint AS node_id, {NAME_EXPR} AS node_name
+    FROM iw_graph."Category" c
+    WHERE NOT EXISTS (SELECT 1 FROM iw_graph.has h WHERE h.end_id = c.id);
+"""
+
+ONE_CHILD_QUERY = f"""
+    WITH one_child AS (
+        SELECT start_id FROM iw_graph.has GROUP BY start_id HAVING COUNT(*) = 1
+    )
+    SELECT c.id::text::bigint AS node_id, {NAME_EXPR} AS node_name
+    FROM one_child o JOIN iw_graph."Category" c ON c.id = o.start_id;
+"""
+
+def print_named_nodes(query):
+    if output_format != "list":
+        write_rows(stream_apache_age_query(query))
+        return
+    for nid, nm in run_apache_age_query(query):
+        print(f" - Node ID={nid}, name={nm}")
+
+def task_7_sql():
+    query = f"""
+        SELECT COUNT(DISTINCT {NAME_EXPR}) AS unique_node_count
+        FROM iw_graph."Category" c;
+    """
+    print_query_result(query)
+
+def task_8_sql():
+    print_named_nodes(ROOTS_QUERY)
+
+def task_9_sql():
+    result = run_apache_age_query(f"SELECT COUNT(*) FROM ({ROOTS_QUERY.rstrip().rstrip(';')}) roots;")
+    if result:
+        print(f"\nTotal {result[0][0]} such nodes.\n")
+
+def task_11_sql():
+    print_named_nodes(ONE_CHILD_QUERY)
+
+def neighbourhood_budget(budget):
+    return None if budget is None or budget == "" else int(budget)
+
+def task_16_sql(node_name, r, budget=None):
+    """16. as a BFS over iw_graph.has keyed by vertex id: one INSERT per level into a temp table of
+    the visited vertices, so every vertex is expanded and summed once, however many paths lead to it"""
+    # Same levels and budget as GraphSnapshot.neighbourhood: the search stops before a level once
+    # the budget is reached and only the nearest `budget` vertices are summed
+    if int(r) < 0:
+        raise ValueError(f"radius must be >= 0, got {r}")
+    radius, budget = int(r), neighbourhood_budget(budget)
+    global failed_queries
+    try:
+        with get_graph_client().connection() as conn:
+            # ON COMMIT DROP needs a transaction; the rollback drops the table on errors too
+            conn.autocommit = False
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute("""
+                        CREATE TEMP TABLE neighbourhood_visited (id ag_catalog.graphid PRIMARY KEY, depth int)
+                        ON COMMIT DROP;
+                    """)
+                    cursor.execute(f"""
+                        INSERT INTO neighbourhood_visited
+                        SELECT c.id, 0 FROM iw_graph."Category" c
+                        WHERE {NAME_EXPR} = %s::ag_catalog.agtype
+                        ON CONFLICT (id) DO NOTHING;
+                    """, (json.dumps(node_name),))
+                    frontier = reached = cursor.rowcount
+                    budget_reached = False
+                    for depth in range(radius):
+                        if not frontier:
+                            break
+                        if budget is not None and reached >= budget:
+                            budget_reached = True
+                            break
+                        cursor.execute("""
+                            INSERT INTO neighbourhood_visited
+                            SELECT DISTINCT h.end_id, %s
+                            FROM neighbourhood_visited v JOIN iw_graph.has h ON h.start_id = v.id
+                            WHERE v.depth = %s
+                            ON CONFLICT (id) DO NOTHING;
+                        """, (depth + 1, depth))
+                        frontier = cursor.rowcount
+                        reached += frontier
+                    cursor.execute("""
+                        SELECT COALESCE(SUM(COALESCE((c.properties::text::jsonb ->> 'popularity')::float8, 0)), 0),
+                               COUNT(*)
+                        FROM (SELECT id FROM neighbourhood_visited ORDER BY depth LIMIT %s) v
+                        JOIN iw_graph."Category" c ON c.id = v.id;
+                    """, (budget,))
+                    popularity, node_count = cursor.fetchone()
+                conn.commit()
+            finally:
+                if not conn.closed:
+                    conn.rollback()
+                    conn.autocommit = True
+    except psycopg2.Error as e:
+        failed_queries += 1
+        print(f"Database error: {e}")
+        return
+    budget_reached = budget_reached or (budget is not None and reached > budget)
+    print_rows(["total_popularity", "node_count", "budget_reached"], [(popularity, node_count, budget_reached)])
+
+def form_outputs(task_number):
+    """(sorted output lines, seconds) of the Cypher and the SQL form of a task, by form"""
+    global output_format
+    forms = {"cypher": CYPHER_FORMS[task_number], "sql": SQL_FORMS[task_number]}
+    outputs = {}
+    timings = {}
+    saved_format = output_format
+    # ndjson rows don't depend on the query text or on the row order once sorted
+    output_format = "ndjson"
+    try:
+        for form, run in forms.items():
+            output = io.StringIO()
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(output):
+                run()
+            timings[form] = time.perf_counter() - start
+            outputs[form] = sorted(line for line in output.getvalue().splitlines() if line.strip())
+    finally:
+        output_format = saved_format
+    return outputs, timings
+
+def verify_task(task_number):
+    """Runs the Cypher and the SQL form of a task and checks that they print the same rows"""
+    outputs, timings = form_outputs(task_number)
+    cypher_rows, sql_rows = outputs["cypher"], outputs["sql"]
+    print(f"Task {task_number}: cypher {timings['cypher']:.2f} s, sql {timings['sql']:.2f} s")
+    if cypher_rows == sql_rows:
+        print(f"VERIFIED: both forms return the same {len(sql_rows)} rows.")
+        return
+    print(f"MISMATCH: cypher returned {len(cypher_rows)} rows, sql {len(sql_rows)} rows.")
+    only_cypher = sorted(set(cypher_rows) - set(sql_rows))[:10]
+    only_sql = sorted(set(sql_rows) - set(cypher_rows))[:10]
+    for line in only_cypher:
+        print(f"  only cypher: {line}")
+    for line in only_sql:
+        print(f"  only sql: {line}")
+    sys.exit(1)
+
 def task_12(old_name, new_name):
     # """12. Renames a given node"""
-    query = f"""
+    query = """
         SELECT * FROM cypher('iw_graph', $$
-            MATCH (n {{name: \'{old_name}\'}})
-            SET n.name = \'{new_name}\'
+            MATCH (n)
+            WHERE n.name = $old_name
+            SET n.name = $new_name
             RETURN n
-        $$) AS result(n agtype);
+        $$, $1) AS result(n agtype);
     """
-    print(query)
-    print(run_apache_age_query(query))
+    print_cypher_result("task_12", query, {"old_name": old_name, "new_name": new_name})
 
 def task_13(node_name, new_popularity):
     # """13. Changes the popularity of a given node"""
-    query = f"""
+    query = """
         SELECT * FROM cypher('iw_graph', $$
-            MATCH (n {{name: \'{node_name}\'}})
-            SET n.popularity = {new_popularity}
+            MATCH (n)
+            WHERE n.name = $node_name
+            SET n.popularity = $popularity
             RETURN n
-        $$) AS result(n agtype);
+        $$, $1) AS result(n agtype);
     """
-    print(query)
-    print(run_apache_age_query(query))
+    print_cypher_result("task_13", query, {"node_name": node_name, "popularity": float(new_popularity)})
 
 def task_14(start_name, end_name, max_path_length=10, incremental_step=1):
     paths = []
     current_path_length = 1
+    length_queries = []
 
     while current_path_length <= max_path_length:
+        # The path length can't be a parameter, so there is one prepared statement per length
         query = f"""
             SELECT p
             FROM cypher('iw_graph', $$
                 MATCH p = (startNode)-[*{current_path_length}]->(endNode)
-                WHERE startNode.name = '{start_name.replace("'", "\'")}' 
-                  AND endNode.name = '{end_name.replace("'", "\'")}'
+                WHERE startNode.name = $start_name
+                  AND endNode.name = $end_name
                 RETURN p
-            $$) AS (p agtype);
+            $$, $1) AS (p agtype);
         """
 
-        result = run_apache_age_query(query)
+        length_queries.append((run_cypher, f"task_14_len_{current_path_length}", query,
+                               {"start_name": start_name, "end_name": end_name}))
+
+        current_path_length += incremental_step
 
+    # Every length is its own query, they run concurrently and are collected in length order
+    for result in run_queries_concurrently(length_queries):
         if result:
             current_paths = [row[0] for row in result]
             num_found = len(current_paths)
             paths.extend(current_paths)
 
-        current_path_length += incremental_step
-
     if paths:
         for idx, path in enumerate(paths, 1):
             print(f"Path {idx}: {path}")
@@ -420,29 +723,29 @@ def task_14(start_name, end_name, max_path_length=10, incremental_step=1):
 def task_15(start_name, end_name, max_path_length=10, incremental_step=1):
     paths = []
     current_path_length = 1
+    length_queries = []
 
     while current_path_length <= max_path_length:
-        start_name_escaped = start_name.replace("'", "''")
-        end_name_escaped = end_name.replace("'", "''")
-
         query = f"""
             SELECT p
             FROM cypher('iw_graph', $$
                 MATCH p = (startNode)-[*{current_path_length}]->(endNode)
-                WHERE startNode.name = '{start_name_escaped}' 
-                  AND endNode.name = '{end_name_escaped}'
+                WHERE startNode.name = $start_name
+                  AND endNode.name = $end_name
                 RETURN p
-            $$) AS (p agtype);
+            $$, $1) AS (p agtype);
         """
 
-        result = run_apache_age_query(query)
+        length_queries.append((run_cypher, f"task_15_len_{current_path_length}", query,
+                               {"start_name": start_name, "end_name": end_name}))
+
+        current_path_length += incremental_step
 
+    for result in run_queries_concurrently(length_queries):
         if result:
             current_paths = [row[0] for row in result]
             paths.extend(current_paths)
 
-        current_path_length += incremental_step
-
     print(f"\nTotal paths found from '{start_name}' to '{end_name}': {len(paths)}")
 
     return paths
@@ -457,9 +760,10 @@ def task_16(node_name, r):
     query = f"""
         WITH nodes0 AS (
             SELECT * FROM cypher('iw_graph', $$
-                MATCH (n {{name: '{node_name}'}})
+                MATCH (n)
+                WHERE n.name = $node_name
                 RETURN n.name, n.popularity
-            $$) AS result(node_name agtype, popularity float)
+            $$, $1) AS result(node_name agtype, popularity float)
         )
         """
 
@@ -475,9 +779,10 @@ def task_16(node_name, r):
         query += f""",
         nodes{i+1} AS (
             SELECT * FROM cypher('iw_graph', $$
-                MATCH (n {{name: '{node_name}'}}){path}(neighbor)
+                MATCH (n){path}(neighbor)
+                WHERE n.name = $node_name
                 RETURN neighbor.name, neighbor.popularity
-            $$) AS result(node_name agtype, popularity float)
+            $$, $1) AS result(node_name agtype, popularity float)
         )
         """
 
@@ -490,50 +795,128 @@ def task_16(node_name, r):
         SELECT SUM(popularity) AS total_popularity
         FROM (SELECT DISTINCT node_name, popularity FROM combined_nodes) AS unique_nodes;
     """
-    print(query)
-    print(run_apache_age_query(query))
+    # The radius shapes the query, so there is one prepared statement per radius
+    print_cypher_result(f"task_16_r_{r}", query, {"node_name": node_name})
 
 def task_17(node_name1, node_name2):
     # 17. policzy popularność na najkrótszej ścieżce między dwoma danymi węzłami, zgodnie ze
     # skierowaniem; popularność na najkrótszej ścieżce jest sumą popularnośi wszystkich węzłów
     # znajdujących się na najkrótszej ścieżce
-    query = f"""
+    query = """
         WITH paths_cte AS (
             SELECT * FROM cypher('iw_graph', $$
-                MATCH path = (V:Category {{name: '{node_name1}'}})-[*]->(V2:Category {{name: '{node_name2}'}})
+                MATCH path = (V:Category)-[*]->(V2:Category)
+                WHERE V.name = $node_name1 AND V2.name = $node_name2
                 UNWIND nodes(path) AS nodes_on_path
                 RETURN nodes_on_path.popularity, length(path)
-            $$) AS result(popularity_on_path float, path_len int)
+            $$, $1) AS result(popularity_on_path float, path_len int)
         )
         SELECT popularity_on_path
         FROM paths_cte
         ORDER BY path_len ASC
         LIMIT 1;
     """
-    print(query)
-    print(run_apache_age_query(query))
+    print_cypher_result("task_17", query, {"node_name1": node_name1, "node_name2": node_name2})
 
 def task_18(node_name1, node_name2):
     # 18. znajdzie skierowaną ścieżkę pomiędzy dwoma węzłami o największej popularności spośród
     # wszystkich ścieżek pomiędzy tymi węzłami
-    query = f"""
+    query = """
         WITH paths_cte AS (
             SELECT * FROM cypher('iw_graph', $$
-                MATCH path = (V:Category {{name: '{node_name1}'}})-[*]->(V2:Category {{name: '{node_name2}'}})
+                MATCH path = (V:Category)-[*]->(V2:Category)
+                WHERE V.name = $node_name1 AND V2.name = $node_name2
                 UNWIND nodes(path) AS nodes_on_path
                 RETURN nodes_on_path.popularity, path
-            $$) AS result(popularity_on_path float, path agtype)
+            $$, $1) AS result(popularity_on_path float, path agtype)
         )
         SELECT path
         FROM paths_cte
         ORDER BY popularity_on_path DESC
         LIMIT 1;
     """
-    print(query)
-    print(run_apache_age_query(query))
+    print_cypher_result("task_18", query, {"node_name1": node_name1, "node_name2": node_name2})
+
+def path_lengths(max_path_length, incremental_step):
+    # The lengths the Cypher forms query, one per step
+    return range(1, int(max_path_length) + 1, int(incremental_step))
+
+def task_14_snapshot(start_name, end_name, max_path_length=10, incremental_step=1):
+    """14. from the snapshot: every path of the wanted lengths in one depth-first pass, printed as found"""
+    snapshot = get_graph_snapshot()
+    paths = snapshot.paths(snapshot.find(start_name), snapshot.find(end_name),
+                           path_lengths(max_path_length, incremental_step))
+    if output_format == "list":
+        for idx, path in enumerate(paths, 1):
+            print(f"Path {idx}: {snapshot.names(path)}")
+    else:
+        print_rows(["path", "path_len"], ((snapshot.names(path), len(path) - 1) for path in paths))
+
+def task_15_snapshot(start_name, end_name, max_path_length=10, incremental_step=1):
+    """15. from the snapshot: the paths are counted per length by dynamic programming, none is built"""
+    snapshot = get_graph_snapshot()
+    counts = snapshot.count_paths(snapshot.find(start_name), snapshot.find(end_name),
+                                  path_lengths(max_path_length, incremental_step))
+    if output_format == "list":
+        print(f"\nTotal paths found from '{start_name}' to '{end_name}': {sum(counts.values())}")
+    else:
+        print_rows(["path_len", "path_count"], counts.items())
+
+def task_16_snapshot(node_name, r, budget=None):
+    """16. from the snapshot: a frontier BFS that reaches every vertex once"""
+    if int(r) < 0:
+        raise ValueError(f"radius must be >= 0, got {r}")
+    snapshot = get_graph_snapshot()
+    nodes, budget_reached = snapshot.neighbourhood(snapshot.find(node_name), int(r), neighbourhood_budget(budget))
+    popularity = float(snapshot.popularity[nodes].sum())
+    print_rows(["total_popularity", "node_count", "budget_reached"], [(popularity, len(nodes), budget_reached)])
+
+def task_17_snapshot(node_name1, node_name2, max_depth=None):
+    """17. from the snapshot: a shortest path by bidirectional BFS, its length and popularity sum"""
+    snapshot = get_graph_snapshot()
+    path = snapshot.shortest_path(snapshot.find(node_name1), snapshot.find(node_name2),
+                                  None if max_depth is None else int(max_depth))
+    if path is None:
+        print_rows(["path", "path_len", "popularity_on_path"], [])
+        return
+    popularity = float(snapshot.popularity[path].sum())
+    print_rows(["path", "path_len", "popularity_on_path"], [(snapshot.names(path), len(path) - 1, popularity)])
+
+def task_18_snapshot(node_name1, node_name2):
+    """18. from the snapshot: the path with the largest popularity sum, by DP over the component DAG"""
+    snapshot = get_graph_snapshot()
+    result = snapshot.max_popularity_path(snapshot.find(node_name1), snapshot.find(node_name2))
+    if result is None:
+        print_rows(["path", "path_len", "total_popularity"], [])
+        return
+    path, popularity = result
+    print_rows(["path", "path_len", "total_popularity"], [(snapshot.names(path), len(path) - 1, popularity)])
+
+# Tasks with an equivalent SQL form, see --engine
+CYPHER_FORMS = {7: task_7, 8: task_8, 9: task_9, 11: task_11}
+SQL_FORMS = {7: task_7_sql, 8: task_8_sql, 9: task_9_sql, 11: task_11_sql, 16: task_16_sql}
+
+# Path tasks computed in-process from the snapshot, see --engine snapshot
+SNAPSHOT_FORMS = {
+    14: task_14_snapshot, 15: task_15_snapshot, 16: task_16_snapshot, 17: task_17_snapshot, 18: task_18_snapshot,
+}
+
+# cypher, sql (the SQL form where a task has one), verify (run both and compare) or snapshot
+engine = "cypher"
 
 def main(task_number, *args):
-    if task_number == 1:
+    if task_number in SNAPSHOT_TASKS and engine == "snapshot":
+        snapshot_task(task_number, args)
+    elif task_number in SNAPSHOT_FORMS and engine == "snapshot":
+        SNAPSHOT_FORMS[task_number](*args)
+    elif task_number in SQL_FORMS and engine == "sql":
+        SQL_FORMS[task_number](*args)
+    elif task_number in CYPHER_FORMS and engine == "verify":
+        verify_task(task_number)
+    # Several names for tasks 1-6 are resolved together
+    elif task_number in BATCH_TASKS and len(args) > 1:
+        batch_task(task_number, args)
+    elif task_number == 1:
         task_1(args[0])
     elif task_number == 2:
         task_2(args[0])
@@ -573,14 +956,94 @@ def main(task_number, *args):
         print("Invalid goal number. Please provide a goal between 1 and 16")
         sys.exit(1)
 
+# Tasks that change the graph, the output of every other task can be cached
+WRITE_TASKS = {12, 13}
+
+# Created by the CLI / server when caching is on
+result_cache = None
+
+def graph_generation():
+    with get_graph_client().connection() as conn:
+        with conn.cursor() as cursor:
+            return read_generation(cursor)
+
+def run_task(task_number, *args):
+    """main() behind the result cache: a read task is answered from the cache while the graph
+    generation it was computed for is current, a write task that went through bumps the generation"""
+    global graph_snapshot
+    if task_number in WRITE_TASKS:
+        failed_before = failed_queries
+        main(task_number, *args)
+        # A failed write changed nothing, the cached results and the snapshot are still current
+        if failed_queries != failed_before:
+            return
+        with get_graph_client().connection() as conn:
+            with conn.cursor() as cursor:
+                bump_generation(cursor)
+        # Reloaded (and refused as stale) by the next snapshot task
+        graph_snapshot = None
+        if result_cache is not None:
+            result_cache.clear()
+        return
+    if result_cache is None:
+        main(task_number, *args)
+        return
+
+    key = (task_number, tuple(str(arg).strip() for arg in args), output_format, engine, graph_generation())
+    output = result_cache.get(key)
+    if output is not None:
+        sys.stdout.write(output)
+        return
+    failed_before = failed_queries
+    tee = TeeOutput(sys.stdout)
+    with contextlib.redirect_stdout(tee):
+        main(task_number, *args)
+    if failed_queries == failed_before and tee.getvalue() is not None:
+        result_cache.put(key, tee.getvalue())
+
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python dbcli.py <integer> [additional arguments...]")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Runs one of the iw_graph tasks")
+    parser.add_argument("task_number", type=int)
+    parser.add_argument("args", nargs="*")
+    parser.add_argument("--format", choices=["list", "ndjson", "csv"], default="list",
+                        help="ndjson/csv stream the rows through a server-side cursor instead of one Python list")
+    parser.add_argument("--fetch-size", type=int, default=FETCH_SIZE,
+                        help="rows fetched per round trip when streaming")
+    parser.add_argument("--concurrency", type=int, default=4,
+                        help="independent queries of a task (pages, path lengths, batches) run at the same time")
+    parser.add_argument("--engine", choices=["cypher", "sql", "verify", "snapshot"], default="cypher",
+                        help="tasks 7, 8, 9, 11: run the Cypher form, the set-based SQL form over the label tables, "
+                             "or both and check that they return the same rows; task 16: sql runs a BFS over "
+                             "iw_graph.has, one INSERT per level into a temp table of the visited vertices; "
+                             "tasks 1-6 and 14-18: snapshot answers from the memory-mapped graph snapshot exported "
+                             "by graph_snapshot.py (tasks 14 and 15 take an optional maximum path length and step, "
+                             "16 a node budget, 17 a maximum length)")
+    parser.add_argument("--snapshot-path", default=SNAPSHOT_DIR, help="directory of the graph snapshot")
+    parser.add_argument("--cache-file", default=None,
+                        help="cache the results of read tasks in this file, so later runs on the same graph reuse them")
+    parser.add_argument("--cache-size", type=int, default=MAX_ENTRIES, help="results kept in the cache")
+    parser.add_argument("--cache-ttl", type=float, default=None, help="seconds a cached result stays valid")
+    parser.add_argument("--names-file", default=None,
+                        help="tasks 1-6: also run for every name in this file, one per line ('-' reads stdin)")
+    cli_args = parser.parse_args()
+    output_format = cli_args.format
+    fetch_size = cli_args.fetch_size
+    concurrency = cli_args.concurrency
+    engine = cli_args.engine
+    snapshot_path = cli_args.snapshot_path
+    if cli_args.cache_file:
+        result_cache = ResultCache(cli_args.cache_size, cli_args.cache_ttl, cli_args.cache_file)
+
+    task_args = cli_args.args
+    if cli_args.names_file:
+        if cli_args.task_number not in BATCH_TASKS:
+            parser.error("--names-file works with tasks 1-6 only")
+        task_args = task_args + read_names(cli_args.names_file)
 
     try:
-        task_number = int(sys.argv[1])
-        args = sys.argv[2:]
-        main(task_number, *args)
-    except ValueError:
-        print("Error: The first argument must be an integer.")
+        run_task(cli_args.task_number, *task_args)
+    finally:
+        if result_cache is not None:
+            result_cache.save()
+        if graph_client is not None:
+            graph_client.close()
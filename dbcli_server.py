@@ -0,0 +1,132 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import shlex
+import socketserver
+import sys
+import threading
+import time
+
+import dbcli
+from result_cache import ResultCache
+
+# Tasks print their results, so only one runs at a time while its stdout is captured
+task_lock = threading.Lock()
+
+
+def parse_request(line):
+    """'<request id> <task number> [args...]', arguments quoted like in a shell"""
+    request_id, task_number, *args = shlex.split(line)
+    return request_id, int(task_number), args
+
+
+def output_lines(text):
+    # ndjson rows are decoded so the reply stays one JSON document, other lines are kept as text
+    lines = []
+    for line in text.splitlines():
+        try:
+            lines.append(json.loads(line))
+        except ValueError:
+            lines.append(line)
+    return lines
+
+
+def handle_line(line):
+    """Runs one request and returns its reply, a JSON line tagged with the request id"""
+    try:
+        request_id, task_number, args = parse_request(line)
+    except ValueError as e:
+        return json.dumps({"id": None, "error": f"Bad request {line!r}: {e}"})
+
+    reply = {"id": request_id, "task": task_number}
+    output = io.StringIO()
+    start = time.perf_counter()
+    with task_lock:
+        try:
+            with contextlib.redirect_stdout(output):
+                dbcli.run_task(task_number, *args)
+        except SystemExit as e:
+            reply["error"] = f"Task exited with code {e.code}"
+        except Exception as e:
+            reply["error"] = str(e) or type(e).__name__
+    reply["ms"] = round((time.perf_counter() - start) * 1000, 2)
+    reply["output"] = output_lines(output.getvalue())
+    return json.dumps(reply, ensure_ascii=False)
+
+
+def serve_lines(lines, write):
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        write(handle_line(line) + "\n")
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        def write(reply):
+            self.wfile.write(reply.encode("utf-8"))
+            self.wfile.flush()
+        serve_lines((line.decode("utf-8") for line in self.rfile), write)
+
+
+def serve_socket(path):
+    if os.path.exists(path):
+        os.remove(path)
+    with socketserver.ThreadingUnixStreamServer(path, RequestHandler) as server:
+        print(f"Listening on {path}", file=sys.stderr)
+        try:
+            server.serve_forever()
+        finally:
+            os.remove(path)
+
+
+def write_stdout(reply):
+    sys.stdout.write(reply)
+    sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Keeps dbcli's connections and prepared statements warm and runs task requests, "
+                    "one '<request id> <task number> [args...]' per line, answering with one JSON line each"
+    )
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--input", default=None, help="read the requests from this file instead of stdin")
+    source.add_argument("--socket", default=None, help="serve the requests on this Unix socket")
+    parser.add_argument("--format", choices=["list", "ndjson", "csv"], default="ndjson",
+                        help="task output format, see dbcli.py --format")
+    parser.add_argument("--fetch-size", type=int, default=dbcli.FETCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=dbcli.concurrency)
+    parser.add_argument("--engine", choices=["cypher", "sql", "verify", "snapshot"], default=dbcli.engine)
+    parser.add_argument("--snapshot-path", default=dbcli.snapshot_path)
+    parser.add_argument("--no-cache", action="store_true", help="don't cache the results of read tasks")
+    parser.add_argument("--cache-file", default=None, help="also keep the result cache in this file between runs")
+    parser.add_argument("--cache-size", type=int, default=dbcli.MAX_ENTRIES)
+    parser.add_argument("--cache-ttl", type=float, default=None, help="seconds a cached result stays valid")
+    args = parser.parse_args()
+    dbcli.output_format = args.format
+    dbcli.fetch_size = args.fetch_size
+    dbcli.concurrency = args.concurrency
+    dbcli.engine = args.engine
+    dbcli.snapshot_path = args.snapshot_path
+    if not args.no_cache:
+        dbcli.result_cache = ResultCache(args.cache_size, args.cache_ttl, args.cache_file)
+
+    try:
+        if args.socket:
+            serve_socket(args.socket)
+        elif args.input:
+            with open(args.input, encoding="utf-8") as f:
+                serve_lines(f, write_stdout)
+        else:
+            serve_lines(sys.stdin, write_stdout)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if dbcli.result_cache is not None:
+            dbcli.result_cache.save()
+        if dbcli.graph_client is not None:
+            dbcli.graph_client.close()
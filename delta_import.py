@@ -0,0 +1,219 @@
+import argparse
+import io
+
+import numpy as np
+import pandas as pd
+import psycopg2
+
+import copy_loader
+import result_cache
+from copy_loader import EDGE_LABEL, VERTEX_LABEL
+from import_v3 import DB_PARAMS, count_rows, make_age_compatable_df, process_popularity, process_taxonomy
+
+
+def read_query(cursor, query, names, dtypes):
+    # COPY the result out in one stream instead of fetching millions of tuples
+    buffer = io.StringIO()
+    cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv)", buffer)
+    buffer.seek(0)
+    return pd.read_csv(buffer, header=None, names=names, dtype=dtypes, keep_default_na=False)
+
+
+def read_graph_nodes(cursor):
+    """(entry_id, name, popularity) of every vertex currently in the graph"""
+    _, table, _ = copy_loader.get_label_info(cursor, VERTEX_LABEL)
+    return read_query(cursor, f"""
+        SELECT id::text::bigint & {(1 << copy_loader.ENTRY_ID_BITS) - 1},
+               properties::text::jsonb ->> 'name',
+               coalesce((properties::text::jsonb ->> 'popularity')::float8, 0)
+        FROM {table}
+    """, ['entry_id', 'name', 'popularity'], {'entry_id': np.int64, 'name': object, 'popularity': np.float64})
+
+
+def read_graph_edges(cursor):
+    """(start_entry_id, end_entry_id) of every edge currently in the graph"""
+    _, table, _ = copy_loader.get_label_info(cursor, EDGE_LABEL)
+    mask = (1 << copy_loader.ENTRY_ID_BITS) - 1
+    return read_query(cursor, f"""
+        SELECT start_id::text::bigint & {mask}, end_id::text::bigint & {mask}
+        FROM {table}
+    """, ['start_entry_id', 'end_entry_id'], {'start_entry_id': np.int64, 'end_entry_id': np.int64})
+
+
+def compute_delta(graph_nodes, graph_edges, nodes_df, edges_df):
+    """Compares the loaded graph with the frames built from the new dump, matching nodes by name
+    and edges by (parent, child) name pair"""
+    # One code space for the names of both sides
+    codes, names = pd.factorize(np.concatenate([
+        graph_nodes['name'].to_numpy(dtype=object), nodes_df['name'].to_numpy(dtype=object)
+    ]))
+    graph_codes = codes[:len(graph_nodes)]
+    new_codes = codes[len(graph_nodes):]
+    num_names = len(names)
+
+    in_graph = np.zeros(num_names, dtype=bool)
+    in_graph[graph_codes] = True
+    in_new = np.zeros(num_names, dtype=bool)
+    in_new[new_codes] = True
+
+    added = ~in_graph[new_codes]
+    added_nodes = nodes_df.loc[added, ['name', 'popularity']].reset_index(drop=True)
+    added_nodes['code'] = new_codes[added]
+    removed_nodes = graph_nodes.loc[~in_new[graph_codes], ['entry_id', 'name']].reset_index(drop=True)
+
+    # Popularity of the nodes present on both sides
+    new_popularity = np.full(num_names, np.nan)
+    new_popularity[new_codes] = nodes_df['popularity'].to_numpy()
+    kept = in_new[graph_codes]
+    changed = kept & (new_popularity[graph_codes] != graph_nodes['popularity'].to_numpy())
+    popularity_updates = pd.DataFrame({
+        'entry_id': graph_nodes['entry_id'].to_numpy()[changed],
+        'popularity': new_popularity[graph_codes[changed]],
+    })
+
+    # Edges as one int64 key per (start name, end name) pair
+    entry_index = pd.Index(graph_nodes['entry_id'])
+    graph_keys = (graph_codes[entry_index.get_indexer(graph_edges['start_entry_id'])].astype(np.int64) * num_names
+                  + graph_codes[entry_index.get_indexer(graph_edges['end_entry_id'])])
+    new_keys = np.unique(new_codes[edges_df['start_id'].to_numpy() - 1].astype(np.int64) * num_names
+                         + new_codes[edges_df['end_id'].to_numpy() - 1])
+
+    removed_edges = graph_edges.loc[~np.isin(graph_keys, new_keys)].drop_duplicates().reset_index(drop=True)
+    added_keys = new_keys[~np.isin(new_keys, graph_keys)]
+    added_edges = pd.DataFrame({'start_code': added_keys // num_names, 'end_code': added_keys % num_names})
+
+    # Entry ids of names that already are vertices; added vertices get theirs when applied
+    entry_ids = np.zeros(num_names, dtype=np.int64)
+    entry_ids[graph_codes] = graph_nodes['entry_id'].to_numpy()
+
+    return {
+        'added_nodes': added_nodes,
+        'removed_nodes': removed_nodes,
+        'popularity_updates': popularity_updates,
+        'added_edges': added_edges,
+        'removed_edges': removed_edges,
+        'entry_ids': entry_ids,
+    }
+
+
+def print_delta(delta):
+    print(f"Nodes to add: {len(delta['added_nodes'])}")
+    print(f"Nodes to remove: {len(delta['removed_nodes'])}")
+    print(f"Popularity values to update: {len(delta['popularity_updates'])}")
+    print(f"Edges to add: {len(delta['added_edges'])}")
+    print(f"Edges to remove: {len(delta['removed_edges'])}")
+
+
+def reserve_entry_ids(cursor, label_name, count):
+    # Taken from the label's own sequence, so they never collide with ids created meanwhile
+    if count == 0:
+        return np.array([], dtype=np.int64)
+    _, _, seq_name = copy_loader.get_label_info(cursor, label_name)
+    cursor.execute("SELECT nextval(%s) FROM generate_series(1, %s);", (seq_name, count))
+    return np.array([row[0] for row in cursor.fetchall()], dtype=np.int64)
+
+
+def copy_into_temp_table(cursor, name, columns, df):
+    cursor.execute(f"CREATE TEMP TABLE {name} ({', '.join(columns)}) ON COMMIT DROP;")
+    for start in range(0, len(df), copy_loader.COPY_BATCH_ROWS):
+        copy_loader.copy_batch(cursor, name, [c.split()[0] for c in columns],
+                               df.iloc[start:start + copy_loader.COPY_BATCH_ROWS])
+
+
+def apply_delta(conn, delta):
+    """Applies the delta in a single transaction; readers keep seeing the old graph until it commits"""
+    cursor = conn.cursor()
+    vertex_label_id, vertex_table, _ = copy_loader.get_label_info(cursor, VERTEX_LABEL)
+    edge_label_id, edge_table, _ = copy_loader.get_label_info(cursor, EDGE_LABEL)
+    entry_ids = delta['entry_ids']
+
+    # Edges first, so that no edge is left pointing at a removed vertex
+    removed_edges = delta['removed_edges']
+    if len(removed_edges):
+        copy_into_temp_table(cursor, "delta_removed_edges",
+                             ["start_id ag_catalog.graphid", "end_id ag_catalog.graphid"], pd.DataFrame({
+                                 'start_id': copy_loader.make_graphids(vertex_label_id, removed_edges['start_entry_id']),
+                                 'end_id': copy_loader.make_graphids(vertex_label_id, removed_edges['end_entry_id']),
+                             }))
+        cursor.execute(f"""
+            DELETE FROM {edge_table} e USING delta_removed_edges d
+            WHERE e.start_id = d.start_id AND e.end_id = d.end_id;
+        """)
+        print(f"Removed {cursor.rowcount} edges.")
+
+    removed_nodes = delta['removed_nodes']
+    if len(removed_nodes):
+        copy_into_temp_table(cursor, "delta_removed_nodes", ["id ag_catalog.graphid"], pd.DataFrame({
+            'id': copy_loader.make_graphids(vertex_label_id, removed_nodes['entry_id']),
+        }))
+        cursor.execute(f"DELETE FROM {vertex_table} v USING delta_removed_nodes d WHERE v.id = d.id;")
+        print(f"Removed {cursor.rowcount} nodes.")
+
+    updates = delta['popularity_updates']
+    if len(updates):
+        copy_into_temp_table(cursor, "delta_popularity", ["id ag_catalog.graphid", "popularity float8"], pd.DataFrame({
+            'id': copy_loader.make_graphids(vertex_label_id, updates['entry_id']),
+            'popularity': updates['popularity'],
+        }))
+        cursor.execute(f"""
+            UPDATE {vertex_table} v
+            SET properties = (v.properties::text::jsonb || jsonb_build_object('popularity', d.popularity))::text::ag_catalog.agtype
+            FROM delta_popularity d
+            WHERE v.id = d.id;
+        """)
+        print(f"Updated popularity of {cursor.rowcount} nodes.")
+
+    added_nodes = delta['added_nodes']
+    if len(added_nodes):
+        new_ids = reserve_entry_ids(cursor, VERTEX_LABEL, len(added_nodes))
+        entry_ids[added_nodes['code'].to_numpy()] = new_ids
+        copy_loader.copy_vertices(cursor, pd.DataFrame({
+            'id': new_ids, 'name': added_nodes['name'], 'popularity': added_nodes['popularity'],
+        }))
+        print(f"Added {len(added_nodes)} nodes.")
+
+    added_edges = delta['added_edges']
+    if len(added_edges):
+        new_ids = reserve_entry_ids(cursor, EDGE_LABEL, len(added_edges))
+        for start in range(0, len(added_edges), copy_loader.COPY_BATCH_ROWS):
+            batch = added_edges.iloc[start:start + copy_loader.COPY_BATCH_ROWS]
+            copy_loader.copy_batch(cursor, edge_table, ["id", "start_id", "end_id", "properties"], pd.DataFrame({
+                'id': copy_loader.make_graphids(edge_label_id, new_ids[start:start + len(batch)]),
+                'start_id': copy_loader.make_graphids(vertex_label_id, entry_ids[batch['start_code'].to_numpy()]),
+                'end_id': copy_loader.make_graphids(vertex_label_id, entry_ids[batch['end_code'].to_numpy()]),
+                'properties': '{}',
+            }))
+        print(f"Added {len(added_edges)} edges.")
+
+    result_cache.bump_generation(cursor)
+    conn.commit()
+    cursor.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Brings the loaded iw_graph up to date with new taxonomy/popularity dumps, changing only what differs"
+    )
+    parser.add_argument("--dry-run", action="store_true", help="only print the size of the delta")
+    args = parser.parse_args()
+
+    popularity_df = process_popularity()
+    taxonomy_df = process_taxonomy()
+    count_rows(popularity_df, taxonomy_df)
+    nodes_df, edges_df = make_age_compatable_df(taxonomy_df, popularity_df)
+
+    conn = psycopg2.connect(**DB_PARAMS)
+    try:
+        cursor = conn.cursor()
+        print("Reading the loaded graph...")
+        graph_nodes = read_graph_nodes(cursor)
+        graph_edges = read_graph_edges(cursor)
+        cursor.close()
+
+        delta = compute_delta(graph_nodes, graph_edges, nodes_df, edges_df)
+        print_delta(delta)
+        if not args.dry_run:
+            apply_delta(conn, delta)
+            print("DELTA APPLIED SECCESSFULLY.")
+    finally:
+        conn.close()
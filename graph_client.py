@@ -0,0 +1,116 @@
+import json
+from contextlib import contextmanager
+from itertools import count
+
+import psycopg2
+import psycopg2.extensions
+import psycopg2.extras
+from psycopg2 import pool
+
+import agtype
+
+# Run once on every new connection, they stay in effect for the whole session
+SESSION_SETUP = ("LOAD 'age';", "SET search_path TO ag_catalog;")
+
+# Rows a streaming cursor fetches from the server per round trip
+FETCH_SIZE = 10_000
+
+
+class AgeConnection(psycopg2.extensions.connection):
+    """psycopg2 connection that remembers whether the AGE session setup already ran on it
+    and which statements are prepared on it"""
+
+    age_ready = False
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+
+class GraphClient:
+    """Pool of AGE-ready connections; a query borrows one instead of connecting and loading AGE again"""
+
+    def __init__(self, db_params, min_connections=1, max_connections=8):
+        self.pool = pool.ThreadedConnectionPool(
+            min_connections, max_connections, connection_factory=AgeConnection, **db_params
+        )
+        self.max_connections = max_connections
+        self.cursor_names = count()
+
+    @contextmanager
+    def connection(self):
+        conn = self.pool.getconn()
+        try:
+            if not conn.age_ready:
+                conn.autocommit = True
+                with conn.cursor() as cursor:
+                    for statement in SESSION_SETUP:
+                        cursor.execute(statement)
+                agtype.register(conn)
+                conn.age_ready = True
+            yield conn
+        finally:
+            # A connection that broke while borrowed is dropped, the pool opens a new one when needed
+            self.pool.putconn(conn, close=bool(conn.closed))
+
+    def query(self, query, params=None, raw=False):
+        """Rows of query with agtype values decoded, or left as text with raw=True for the bulk decoders"""
+        with self.connection() as conn:
+            with conn.cursor() as cursor:
+                if raw:
+                    agtype.register_raw(cursor)
+                cursor.execute(query, params)
+                return cursor.fetchall()
+
+    def prepare(self, conn, name, statement):
+        """PREPAREs statement as `name` on conn unless it already is; $1 is the agtype parameter map"""
+        if name not in conn.prepared:
+            with conn.cursor() as cursor:
+                cursor.execute(f"PREPARE {name}(agtype) AS {statement}")
+            conn.prepared.add(name)
+
+    def cypher(self, name, statement, args):
+        """Runs the cypher statement with args passed as its parameter map; the plan is built
+        once per connection and reused by every later call with the same name"""
+        with self.connection() as conn:
+            self.prepare(conn, name, statement)
+            with conn.cursor() as cursor:
+                cursor.execute(f"EXECUTE {name}(%s)", (json.dumps(args),))
+                return cursor.fetchall()
+
+    def stream(self, query, params=None, fetch_size=FETCH_SIZE):
+        """Yields the rows of query as named tuples, fetched fetch_size at a time from a server-side cursor
+
+        The connection stays borrowed until the iterator is exhausted or closed.
+        """
+        with self.connection() as conn:
+            yield from self.stream_on(conn, query, params, fetch_size)
+
+    def stream_cypher(self, name, statement, args, fetch_size=FETCH_SIZE):
+        """Like cypher, but streams the rows; a cursor can't be declared over EXECUTE, so the
+        result is materialized into a temp table on the server and streamed from there"""
+        with self.connection() as conn:
+            self.prepare(conn, name, statement)
+            setup = (f"CREATE TEMP TABLE {name}_result ON COMMIT DROP AS EXECUTE {name}(%s)", (json.dumps(args),))
+            yield from self.stream_on(conn, f"SELECT * FROM {name}_result", None, fetch_size, setup)
+
+    def stream_on(self, conn, query, params, fetch_size, setup=None):
+        # A named cursor only lives inside a transaction
+        conn.autocommit = False
+        try:
+            if setup:
+                with conn.cursor() as cursor:
+                    cursor.execute(*setup)
+            with conn.cursor(name=f"stream_{next(self.cursor_names)}",
+                             cursor_factory=psycopg2.extras.NamedTupleCursor) as cursor:
+                cursor.itersize = fetch_size
+                cursor.execute(query, params)
+                yield from cursor
+            conn.commit()
+        finally:
+            if not conn.closed:
+                conn.rollback()
+                conn.autocommit = True
+
+    def close(self):
+        self.pool.closeall()
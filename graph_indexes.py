@@ -0,0 +1,110 @@
+import argparse
+import json
+import sys
+import time
+
+import psycopg2
+
+# (index name, label table, index definition); the name expression is the one AGE generates
+# for `WHERE n.name = ...`, so the planner can match it. A property map like `(n {name: ...})`
+# compiles to `properties @> ...` containment instead, which only the GIN index can serve, so the
+# dbcli lookups are written with WHERE
+INDEXES = [
+    ("category_id_idx", 'iw_graph."Category"', "USING btree (id)"),
+    ("category_name_idx", 'iw_graph."Category"',
+     """USING btree (ag_catalog.agtype_access_operator(VARIADIC ARRAY[properties, '"name"'::ag_catalog.agtype]))"""),
+    ("has_start_id_idx", "iw_graph.has", "USING btree (start_id)"),
+    ("has_end_id_idx", "iw_graph.has", "USING btree (end_id)"),
+]
+
+# Optional, helps property-map containment matches but is large and slow to build
+GIN_INDEXES = [
+    ("category_properties_gin_idx", 'iw_graph."Category"', "USING gin (properties)"),
+]
+
+LABEL_TABLES = ['iw_graph."Category"', "iw_graph.has"]
+
+
+def build_indexes(conn, gin=False):
+    """Creates the missing lookup indexes on the iw_graph label tables and refreshes their statistics"""
+    conn.autocommit = True
+    cursor = conn.cursor()
+    cursor.execute("LOAD 'age';")
+    cursor.execute("SET search_path TO ag_catalog;")
+
+    report = []
+    for name, table, definition in INDEXES + (GIN_INDEXES if gin else []):
+        start = time.perf_counter()
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} {definition};")
+        elapsed = time.perf_counter() - start
+        cursor.execute("SELECT pg_size_pretty(pg_relation_size(%s::regclass));", (f"iw_graph.{name}",))
+        report.append((name, elapsed, cursor.fetchone()[0]))
+
+    start = time.perf_counter()
+    for table in LABEL_TABLES:
+        cursor.execute(f"ANALYZE {table};")
+    report.append(("ANALYZE", time.perf_counter() - start, "-"))
+
+    cursor.close()
+    for name, elapsed, size in report:
+        print(f"{name:<30} {elapsed:8.1f} s  {size:>10}")
+    return report
+
+
+# Shape of the dbcli name lookups (tasks 1-6, 12, 13, 16-18)
+NAME_LOOKUP = """
+    SELECT * FROM cypher('iw_graph', $$
+        MATCH (n)
+        WHERE n.name = $node_name
+        RETURN n
+    $$, $1) AS result(n agtype)
+"""
+
+
+def explain_name_lookup(conn):
+    """EXPLAINs the name lookup with both a custom and a generic plan; True if category_name_idx serves both"""
+    conn.autocommit = True
+    cursor = conn.cursor()
+    cursor.execute("LOAD 'age';")
+    cursor.execute("SET search_path TO ag_catalog;")
+    cursor.execute("""
+        SELECT agtype_access_operator(VARIADIC ARRAY[properties, '"name"'::agtype])::text
+        FROM iw_graph."Category" LIMIT 1;
+    """)
+    row = cursor.fetchone()
+    if row is None:
+        print("The graph has no vertices to look up")
+        return False
+    args = json.dumps({"node_name": json.loads(row[0])})
+
+    cursor.execute(f"PREPARE name_lookup(agtype) AS {NAME_LOOKUP}")
+    used = True
+    for plan_mode in ("force_custom_plan", "force_generic_plan"):
+        cursor.execute(f"SET plan_cache_mode = {plan_mode};")
+        cursor.execute("EXPLAIN EXECUTE name_lookup(%s)", (args,))
+        plan = "\n".join(row[0] for row in cursor.fetchall())
+        print(f"{plan_mode}:\n{plan}\n")
+        used = used and "category_name_idx" in plan
+    cursor.execute("RESET plan_cache_mode;")
+    cursor.execute("DEALLOCATE name_lookup;")
+    cursor.close()
+    print("NAME INDEX USED." if used else "WARNING: category_name_idx is not used by the name lookup")
+    return used
+
+
+if __name__ == "__main__":
+    from import_v3 import DB_PARAMS
+
+    parser = argparse.ArgumentParser(description="Builds the lookup indexes of an already loaded iw_graph")
+    parser.add_argument("--gin", action="store_true", help="also build a GIN index on the Category properties")
+    parser.add_argument("--explain", action="store_true",
+                        help="then EXPLAIN the dbcli name lookup and check that it uses category_name_idx")
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(**DB_PARAMS)
+    try:
+        build_indexes(conn, gin=args.gin)
+        if args.explain and not explain_name_lookup(conn):
+            sys.exit(1)
+    finally:
+        conn.close()
@@ -0,0 +1,616 @@
+import argparse
+import json
+import os
+import shutil
+
+import numpy as np
+import psycopg2
+
+import result_cache
+
+# The snapshot files; they are memory mapped read-only, so every process using the snapshot
+# shares the same pages of the page cache
+SNAPSHOT_DIR = ".graph_snapshot"
+
+# Most paths count_paths enumerates one by one when a cycle keeps it from counting them by DP
+TRAIL_BUDGET = 1_000_000
+
+ARRAYS = ["entry_ids", "popularity", "name_offsets",
+          "forward_offsets", "forward_targets", "reverse_offsets", "reverse_targets"]
+
+
+class GraphSnapshot:
+    """Forward (parent -> children) and reverse (child -> parents) CSR adjacency of iw_graph with
+    the names and popularity of its vertices
+
+    Vertices are numbered 0..n-1 in the order of their UTF-8 names, so a name is found by binary
+    search over the name table and vertex sets are plain int arrays.
+    """
+
+    def __init__(self, path=SNAPSHOT_DIR):
+        with open(os.path.join(path, "meta.json"), "r") as f:
+            self.meta = json.load(f)
+        self.generation = self.meta["generation"]
+        self.num_nodes = self.meta["nodes"]
+        self.num_edges = self.meta["edges"]
+        for name in ARRAYS:
+            setattr(self, name, np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r"))
+        # np.memmap can't map an empty file
+        names_path = os.path.join(path, "names.bin")
+        if os.path.getsize(names_path):
+            self.name_bytes = np.memmap(names_path, dtype=np.uint8, mode="r")
+        else:
+            self.name_bytes = np.zeros(0, dtype=np.uint8)
+        # Slicing a memoryview is a lot cheaper than slicing the memmap, the binary search does it ~20 times
+        self.name_view = memoryview(self.name_bytes)
+
+    def name_key(self, node):
+        return self.name_view[self.name_offsets[node]:self.name_offsets[node + 1]].tobytes()
+
+    def name(self, node):
+        return self.name_key(node).decode("utf-8")
+
+    def names(self, nodes):
+        return [self.name(node) for node in nodes]
+
+    def find(self, name):
+        """Vertices named `name` (names aren't unique), as an int array"""
+        key = name.encode("utf-8")
+        lo, hi = 0, self.num_nodes
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.name_key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        end = lo
+        while end < self.num_nodes and self.name_key(end) == key:
+            end += 1
+        return np.arange(lo, end)
+
+    def children(self, node):
+        return self.forward_targets[self.forward_offsets[node]:self.forward_offsets[node + 1]]
+
+    def parents(self, node):
+        return self.reverse_targets[self.reverse_offsets[node]:self.reverse_offsets[node + 1]]
+
+    def children_of(self, nodes):
+        """Children of every vertex in nodes, once per edge like a MATCH over them"""
+        return neighbours(self.forward_offsets, self.forward_targets, nodes)
+
+    def parents_of(self, nodes):
+        return neighbours(self.reverse_offsets, self.reverse_targets, nodes)
+
+    def shortest_path(self, sources, targets, max_depth=None):
+        """Vertices of a shortest directed path from any of sources to any of targets, or None
+
+        Bidirectional BFS: a whole level of the smaller frontier is expanded at a time, forward
+        along the children and backward along the parents, until the two searches meet; the work
+        is bounded by the frontiers, not by the number of paths. max_depth limits the path length.
+        """
+        # Vertex it was reached from on either side (-1 not reached, itself for the start vertices)
+        forward = np.full(self.num_nodes, -1, dtype=np.int64)
+        backward = np.full(self.num_nodes, -1, dtype=np.int64)
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        forward[sources] = sources
+        backward[targets] = targets
+        meet = targets[forward[targets] != -1]
+        forward_frontier, backward_frontier = sources, targets
+        depth = 0
+        while not len(meet) and len(forward_frontier) and len(backward_frontier):
+            if max_depth is not None and depth >= max_depth:
+                return None
+            if len(forward_frontier) <= len(backward_frontier):
+                forward_frontier = expand_level(self.forward_offsets, self.forward_targets, forward_frontier, forward)
+                meet = forward_frontier[backward[forward_frontier] != -1]
+            else:
+                backward_frontier = expand_level(self.reverse_offsets, self.reverse_targets, backward_frontier, backward)
+                meet = backward_frontier[forward[backward_frontier] != -1]
+            depth += 1
+        if not len(meet):
+            return None
+
+        # Any vertex where the searches first meet lies on a shortest path
+        path = [int(meet[0])]
+        while forward[path[0]] != path[0]:
+            path.insert(0, int(forward[path[0]]))
+        while backward[path[-1]] != path[-1]:
+            path.append(int(backward[path[-1]]))
+        return path
+
+    def max_popularity_path(self, sources, targets):
+        """(vertices of the path from sources to targets with the largest popularity sum, that sum), or None
+
+        Step 1 keeps only the vertices reachable from sources and co-reachable to targets. Step 2
+        collapses the cycles among them into strongly connected components. Step 3 is a
+        longest-path DP in topological order over the component DAG, each component weighing
+        the popularity of all its vertices. All three steps are linear in the kept subgraph.
+        Inside a cycle the path walks through every vertex of the component before it leaves,
+        so a vertex may appear twice but is summed once.
+        """
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        if not len(sources) or not len(targets):
+            return None
+
+        # Step 1: the relevant subgraph, renumbered 0..k-1
+        relevant = (reachable(self.forward_offsets, self.forward_targets, sources, self.num_nodes)
+                    & reachable(self.reverse_offsets, self.reverse_targets, targets, self.num_nodes))
+        nodes, local, starts, ends = self.subgraph(relevant)
+        if not len(nodes):
+            return None
+        offsets, neighbours = build_csr(starts, ends, len(nodes), np.int64)
+        reverse = build_csr(ends, starts, len(nodes), np.int64)
+
+        # Step 2: components, every edge between two of them goes to a lower number
+        component, num_components = strongly_connected_components(offsets, neighbours)
+        weight = np.zeros(num_components)
+        np.add.at(weight, component, np.asarray(self.popularity[nodes]))
+
+        # Step 3: best popularity sum of a path ending in each component, in topological order
+        best = np.full(num_components, -np.inf)
+        entry = np.full(num_components, -1, dtype=np.int64)
+        source_components = component[local[sources[relevant[sources]]]]
+        best[source_components] = weight[source_components]
+        entry[source_components] = local[sources[relevant[sources]]]
+        # (previous component, vertex the path leaves it from) on the best path into a component
+        previous = {}
+        crossing = component[starts] != component[ends]
+        edge_from, edge_to = starts[crossing], ends[crossing]
+        for i in np.argsort(-component[edge_from], kind="stable"):
+            u, v = edge_from[i], edge_to[i]
+            c, d = component[u], component[v]
+            if best[c] + weight[d] > best[d]:
+                best[d] = best[c] + weight[d]
+                entry[d] = v
+                previous[d] = (c, u)
+
+        target_locals = local[targets[relevant[targets]]]
+        last = target_locals[np.argmax(best[component[target_locals]])]
+        # Components of the path from the last back to the first, with where it enters and leaves each
+        chain = []
+        c, exit_vertex = component[last], last
+        while True:
+            chain.append((int(entry[c]), int(exit_vertex), c))
+            if c not in previous:
+                break
+            c, exit_vertex = previous[c]
+
+        path = []
+        for enter, leave, c in reversed(chain):
+            path.extend(walk_component((offsets, neighbours), reverse, component, c, enter, leave))
+        return nodes[np.array(path, dtype=np.int64)].tolist(), float(best[component[last]])
+
+    def subgraph(self, relevant):
+        """(vertices of the relevant mask, their number 0..k-1 by vertex, start and end numbers of
+        the edges between them)"""
+        nodes = np.flatnonzero(relevant)
+        local = np.full(self.num_nodes, -1, dtype=np.int64)
+        local[nodes] = np.arange(len(nodes))
+        ends, starts = gather(self.forward_offsets, self.forward_targets, nodes)
+        kept = relevant[ends]
+        return nodes, local, local[starts[kept]], local[ends[kept]]
+
+    def cycle_edges(self, relevant):
+        """(start, end) vertices of the edges between the relevant vertices that lie on a cycle,
+        self-loops included"""
+        nodes, _, starts, ends = self.subgraph(relevant)
+        offsets, neighbours = build_csr(starts, ends, len(nodes), np.int64)
+        component, _ = strongly_connected_components(offsets, neighbours)
+        on_cycle = component[starts] == component[ends]
+        return nodes[starts[on_cycle]], nodes[ends[on_cycle]]
+
+    def depths_to(self, targets, max_depth):
+        """Length of the shortest path from every vertex to any of targets, -1 beyond max_depth"""
+        return bfs_depths(self.reverse_offsets, self.reverse_targets, targets, max_depth, self.num_nodes)
+
+    def depths_from(self, sources, max_depth):
+        """Length of the shortest path from any of sources to every vertex, -1 beyond max_depth"""
+        return bfs_depths(self.forward_offsets, self.forward_targets, sources, max_depth, self.num_nodes)
+
+    def neighbourhood(self, sources, radius, budget=None):
+        """(vertices at most radius edges below sources, whether the budget cut the search short)
+
+        Every vertex is reached once, by a BFS over whole levels; with a budget the search stops
+        once that many vertices are reached and keeps the nearest of them.
+        """
+        reached_from = np.full(self.num_nodes, -1, dtype=np.int64)
+        frontier = np.unique(np.asarray(sources, dtype=np.int64))
+        reached_from[frontier] = frontier
+        levels = [frontier]
+        reached = len(frontier)
+        budget_reached = False
+        for _ in range(radius):
+            if not len(frontier):
+                break
+            if budget is not None and reached >= budget:
+                budget_reached = True
+                break
+            frontier = expand_level(self.forward_offsets, self.forward_targets, frontier, reached_from)
+            levels.append(frontier)
+            reached += len(frontier)
+        nodes = np.concatenate(levels)
+        if budget is not None and len(nodes) > budget:
+            nodes = nodes[:budget]
+            budget_reached = True
+        return nodes, budget_reached
+
+    def paths(self, sources, targets, lengths):
+        """Yields every directed path from sources to targets whose length is in lengths, as the
+        list of its vertices, in one depth-first pass
+
+        Like a Cypher [*k] pattern a path may pass a vertex twice but never an edge. A branch is
+        cut as soon as no target is reachable from it within the longest allowed length.
+        """
+        lengths = set(lengths)
+        max_length = max(lengths, default=0)
+        depth = self.depths_to(targets, max_length)
+        is_target = np.zeros(self.num_nodes, dtype=bool)
+        is_target[np.asarray(targets, dtype=np.int64)] = True
+        offsets, neighbours = self.forward_offsets, self.forward_targets
+
+        for source in sources:
+            if depth[source] == -1 or depth[source] > max_length:
+                continue
+            path = [int(source)]
+            edges = []
+            used = set()
+            stack = [iter(range(offsets[source], offsets[source + 1]))]
+            while stack:
+                edge = next(stack[-1], None)
+                if edge is None:
+                    stack.pop()
+                    path.pop()
+                    if edges:
+                        used.discard(edges.pop())
+                    continue
+                node = int(neighbours[edge])
+                remaining = max_length - len(edges) - 1
+                if edge in used or depth[node] == -1 or depth[node] > remaining:
+                    continue
+                edges.append(edge)
+                used.add(edge)
+                path.append(node)
+                if is_target[node] and len(edges) in lengths:
+                    yield list(path)
+                stack.append(iter(range(offsets[node], offsets[node + 1])))
+
+    def count_paths(self, sources, targets, lengths, trail_budget=TRAIL_BUDGET):
+        """Number of directed paths from sources to targets of every length in lengths, without
+        building a single path
+
+        Dynamic programming over the path length: the number of paths of length d ending in each
+        vertex is pushed along the edges to give the numbers for d + 1. The DP counts walks, which
+        may use an edge twice by going around a cycle, while paths() and Cypher never do. A walk
+        can only do that with an edge (u, v) of a cycle it can reach and leave within the longest
+        length: sources to u, the edge, around the cycle back to u, the edge again, v to targets.
+        When some cycle edge is that close, the paths are enumerated with paths() and counted
+        instead; that is exponential in the length, so it stops with a ValueError after
+        trail_budget paths.
+        """
+        lengths = set(lengths)
+        max_length = max(lengths, default=0)
+        depth = self.depths_to(targets, max_length)
+        depth_from = self.depths_from(sources, max_length)
+        on_paths = (depth != -1) & (depth_from != -1) & (depth + depth_from <= max_length)
+        starts, ends = self.cycle_edges(on_paths)
+        # The way back from v to u is at least one edge unless the edge is a self-loop
+        shortest_repeat = depth_from[starts] + depth[ends] + np.where(starts == ends, 2, 3)
+        if (shortest_repeat <= max_length).any():
+            counts_by_length = dict.fromkeys(sorted(lengths), 0)
+            for found, path in enumerate(self.paths(sources, targets, lengths), 1):
+                if found > trail_budget:
+                    raise ValueError(f"More than {trail_budget} paths of length up to {max_length} pass a cycle "
+                                     f"and have to be enumerated; use a smaller maximum path length")
+                counts_by_length[len(path) - 1] += 1
+            return counts_by_length
+
+        is_target = np.zeros(self.num_nodes, dtype=bool)
+        is_target[np.asarray(targets, dtype=np.int64)] = True
+
+        # Sparse vector of path counts: vertices and the number of paths ending in them
+        nodes = np.unique(np.asarray(sources, dtype=np.int64))
+        nodes = nodes[(depth[nodes] != -1) & (depth[nodes] <= max_length)]
+        counts = np.ones(len(nodes), dtype=np.int64)
+        counts_by_length = {}
+        for length in range(1, max_length + 1):
+            if not len(nodes):
+                break
+            next_nodes, _ = gather(self.forward_offsets, self.forward_targets, nodes)
+            degrees = np.asarray(self.forward_offsets[nodes + 1]) - np.asarray(self.forward_offsets[nodes])
+            weights = np.repeat(counts, degrees)
+            # Only vertices that still reach a target in the remaining steps are kept
+            keep = (depth[next_nodes] != -1) & (depth[next_nodes] <= max_length - length)
+            nodes, counts = sum_by_node(next_nodes[keep], weights[keep])
+            if length in lengths:
+                counts_by_length[length] = int(counts[is_target[nodes]].sum())
+        return {length: counts_by_length.get(length, 0) for length in sorted(lengths)}
+
+
+def neighbours(offsets, targets, nodes):
+    nodes = np.asarray(nodes, dtype=np.int64)
+    if len(nodes) == 1:
+        node = nodes[0]
+        return np.asarray(targets[offsets[node]:offsets[node + 1]])
+    if not len(nodes):
+        return np.zeros(0, dtype=targets.dtype)
+    return np.concatenate([targets[offsets[node]:offsets[node + 1]] for node in nodes])
+
+
+def gather(offsets, targets, frontier):
+    """(neighbour, vertex it is a neighbour of) for every edge out of the frontier, in one gather"""
+    starts = np.asarray(offsets[frontier])
+    counts = np.asarray(offsets[frontier + 1]) - starts
+    total = int(counts.sum())
+    # Position of every edge in targets: its list's start plus its index within the list
+    shift = np.repeat(starts - (np.cumsum(counts) - counts), counts)
+    edges = shift + np.arange(total)
+    return np.asarray(targets[edges], dtype=np.int64), np.repeat(frontier, counts)
+
+
+def expand_level(offsets, targets, frontier, reached_from):
+    """One BFS level: marks the unreached neighbours of frontier in reached_from and returns them"""
+    next_nodes, origins = gather(offsets, targets, frontier)
+    new = reached_from[next_nodes] == -1
+    next_nodes, first = np.unique(next_nodes[new], return_index=True)
+    reached_from[next_nodes] = origins[new][first]
+    return next_nodes
+
+
+def bfs_depths(offsets, targets, sources, max_depth, num_nodes):
+    """BFS level of every vertex reached from sources within max_depth edges, -1 for the others"""
+    depth = np.full(num_nodes, -1, dtype=np.int64)
+    reached_from = np.full(num_nodes, -1, dtype=np.int64)
+    frontier = np.unique(np.asarray(sources, dtype=np.int64))
+    reached_from[frontier] = frontier
+    depth[frontier] = 0
+    for level in range(1, max_depth + 1):
+        if not len(frontier):
+            break
+        frontier = expand_level(offsets, targets, frontier, reached_from)
+        depth[frontier] = level
+    return depth
+
+
+def reachable(offsets, targets, sources, num_nodes):
+    """Mask of the vertices reachable from sources (sources included)"""
+    reached_from = np.full(num_nodes, -1, dtype=np.int64)
+    frontier = np.unique(sources)
+    reached_from[frontier] = frontier
+    while len(frontier):
+        frontier = expand_level(offsets, targets, frontier, reached_from)
+    return reached_from != -1
+
+
+def strongly_connected_components(offsets, targets):
+    """(component of every vertex, number of components); Tarjan's algorithm without recursion,
+    so every edge between two components goes from the higher to the lower number"""
+    offsets, targets = offsets.tolist(), targets.tolist()
+    num_nodes = len(offsets) - 1
+    index = [-1] * num_nodes
+    low = [0] * num_nodes
+    on_stack = [False] * num_nodes
+    component = [-1] * num_nodes
+    stack = []
+    counter = 0
+    num_components = 0
+    for root in range(num_nodes):
+        if index[root] != -1:
+            continue
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = True
+        # (vertex, position of its next edge)
+        work = [(root, offsets[root])]
+        while work:
+            node, edge = work[-1]
+            if edge < offsets[node + 1]:
+                work[-1] = (node, edge + 1)
+                neighbour = targets[edge]
+                if index[neighbour] == -1:
+                    index[neighbour] = low[neighbour] = counter
+                    counter += 1
+                    stack.append(neighbour)
+                    on_stack[neighbour] = True
+                    work.append((neighbour, offsets[neighbour]))
+                elif on_stack[neighbour]:
+                    low[node] = min(low[node], index[neighbour])
+                continue
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                low[parent] = min(low[parent], low[node])
+            if low[node] == index[node]:
+                while True:
+                    member = stack.pop()
+                    on_stack[member] = False
+                    component[member] = num_components
+                    if member == node:
+                        break
+                num_components += 1
+    return np.array(component, dtype=np.int64), num_components
+
+
+def component_tree(offsets, targets, start, inside):
+    """BFS tree of the vertices in `inside` reached from start: (reached from, vertices in BFS order)"""
+    reached_from = np.full(len(inside), -1, dtype=np.int64)
+    reached_from[start] = start
+    frontier = np.array([start], dtype=np.int64)
+    order = [frontier]
+    while len(frontier):
+        next_nodes, origins = gather(offsets, targets, frontier)
+        new = inside[next_nodes] & (reached_from[next_nodes] == -1)
+        frontier, first = np.unique(next_nodes[new], return_index=True)
+        reached_from[frontier] = origins[new][first]
+        order.append(frontier)
+    return reached_from, np.concatenate(order)
+
+
+def walk_component(forward, reverse, component, c, enter, leave):
+    """Walk from enter through every vertex of component c to leave, staying inside c
+
+    Follows the BFS out-tree from enter depth-first and, where the next vertex isn't a child of
+    the current one, goes back to enter along the BFS in-tree first; each detour is at most
+    twice the depth of the component.
+    """
+    inside = component == c
+    if np.count_nonzero(inside) == 1:
+        return [enter]
+    out_from, order = component_tree(*forward, enter, inside)
+    # Next vertex towards enter, for every vertex of the component
+    towards_enter, _ = component_tree(*reverse, enter, inside)
+    # Python lists, the walk reads them one element at a time
+    out_from, towards_enter = out_from.tolist(), towards_enter.tolist()
+
+    def route(node, goal):
+        # node -> enter along the in-tree, enter -> goal along the out-tree
+        back = []
+        while node != enter:
+            node = towards_enter[node]
+            back.append(node)
+        down = []
+        while goal != enter:
+            down.append(goal)
+            goal = out_from[goal]
+        return back + down[::-1]
+
+    # Depth-first preorder of the out-tree, so that a child mostly follows its parent directly
+    children = {}
+    for node in order[1:].tolist():
+        children.setdefault(out_from[node], []).append(node)
+    preorder = []
+    stack = [enter]
+    while stack:
+        node = stack.pop()
+        preorder.append(node)
+        stack.extend(reversed(children.get(node, [])))
+
+    visited = {enter}
+    walk = [enter]
+    for node in preorder[1:]:
+        if node in visited:
+            continue
+        hops = [node] if out_from[node] == walk[-1] else route(walk[-1], node)
+        walk.extend(hops)
+        visited.update(hops)
+    if walk[-1] != leave:
+        walk.extend(route(walk[-1], leave))
+    return walk
+
+
+def sum_by_node(nodes, weights):
+    """(distinct nodes, summed weights); counts that could overflow int64 continue as Python ints"""
+    if weights.dtype != object and len(weights) and int(weights.max()) > np.iinfo(np.int64).max // len(weights):
+        weights = weights.astype(object)
+    order = np.argsort(nodes, kind="stable")
+    nodes = nodes[order]
+    unique, starts = np.unique(nodes, return_index=True)
+    if not len(unique):
+        return unique, weights[:0]
+    return unique, np.add.reduceat(weights[order], starts)
+
+
+def build_csr(sources, targets, num_nodes, index_dtype):
+    # Edges sorted by source (then target, so the neighbour lists are sorted too)
+    order = np.lexsort((targets, sources))
+    offsets = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=num_nodes), out=offsets[1:])
+    return offsets, targets[order].astype(index_dtype)
+
+
+def write_snapshot(graph_nodes, graph_edges, generation, path=SNAPSHOT_DIR):
+    """Writes the snapshot of the (entry_id, name, popularity) vertices and
+    (start_entry_id, end_entry_id) edges read from the graph"""
+    # Step 1: number the vertices in name order; UTF-8 byte order is code point order, the same
+    # order the str sort uses
+    names = graph_nodes['name'].to_numpy(dtype=object)
+    order = np.argsort(names, kind="stable")
+    names = names[order]
+    entry_ids = graph_nodes['entry_id'].to_numpy(dtype=np.int64)[order]
+    popularity = graph_nodes['popularity'].to_numpy(dtype=np.float64)[order]
+    num_nodes = len(names)
+    index_dtype = np.int32 if num_nodes < np.iinfo(np.int32).max else np.int64
+
+    # Step 2: edge endpoints from entry ids to vertex numbers
+    by_entry = np.argsort(entry_ids)
+    sorted_entries = entry_ids[by_entry]
+
+    def vertex_numbers(column):
+        ids = graph_edges[column].to_numpy(dtype=np.int64)
+        pos = np.minimum(np.searchsorted(sorted_entries, ids), max(num_nodes - 1, 0))
+        found = sorted_entries[pos] == ids if num_nodes else np.zeros(len(ids), dtype=bool)
+        return by_entry[pos], found
+
+    sources, source_found = vertex_numbers('start_entry_id')
+    targets, target_found = vertex_numbers('end_entry_id')
+    valid = source_found & target_found
+    if not valid.all():
+        print(f"Skipping {int((~valid).sum())} edges with an endpoint that is not a vertex.")
+    sources, targets = sources[valid], targets[valid]
+
+    # Step 3: forward and reverse CSR
+    forward_offsets, forward_targets = build_csr(sources, targets, num_nodes, index_dtype)
+    reverse_offsets, reverse_targets = build_csr(targets, sources, num_nodes, index_dtype)
+
+    # Step 4: name table, the UTF-8 names back to back plus their offsets
+    encoded = [name.encode("utf-8") for name in names]
+    name_offsets = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum([len(name) for name in encoded], out=name_offsets[1:])
+
+    # Step 5: write into a temporary directory and swap it in; processes still mapping the old
+    # files keep reading them until they reload
+    tmp_dir = path + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    arrays = {
+        "entry_ids": entry_ids, "popularity": popularity, "name_offsets": name_offsets,
+        "forward_offsets": forward_offsets, "forward_targets": forward_targets,
+        "reverse_offsets": reverse_offsets, "reverse_targets": reverse_targets,
+    }
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_dir, f"{name}.npy"), array)
+    with open(os.path.join(tmp_dir, "names.bin"), "wb") as f:
+        f.write(b"".join(encoded))
+    with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+        json.dump({"graph": result_cache.GRAPH_NAME, "generation": generation,
+                   "nodes": num_nodes, "edges": int(len(sources))}, f)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_dir, path)
+    return num_nodes, len(sources)
+
+
+def export_snapshot(conn, path=SNAPSHOT_DIR):
+    """Reads the vertices and edges of iw_graph once and writes them as a snapshot"""
+    # The COPY readers come with the import pipeline, only the export needs them
+    import delta_import
+
+    # The generation, the vertices and the edges are read from one consistent state of the graph
+    conn.set_session(isolation_level="REPEATABLE READ")
+    cursor = conn.cursor()
+    generation = result_cache.read_generation(cursor)
+    graph_nodes = delta_import.read_graph_nodes(cursor)
+    graph_edges = delta_import.read_graph_edges(cursor)
+    cursor.close()
+    conn.rollback()
+    return write_snapshot(graph_nodes, graph_edges, generation, path)
+
+
+if __name__ == "__main__":
+    from import_v3 import DB_PARAMS
+
+    parser = argparse.ArgumentParser(
+        description="Exports iw_graph to memory-mapped CSR arrays for dbcli.py --engine snapshot"
+    )
+    parser.add_argument("--path", default=SNAPSHOT_DIR, help="directory of the snapshot files")
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(**DB_PARAMS)
+    try:
+        print("Reading the loaded graph...")
+        num_nodes, num_edges = export_snapshot(conn, args.path)
+        print(f"Snapshot of {num_nodes} nodes and {num_edges} edges written to {args.path}")
+        print("SNAPSHOT EXPORTED SECCESSFULLY.")
+    finally:
+        conn.close()
@@ -0,0 +1,247 @@
+import math
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+from numpy.dtypes import StringDType
+from tqdm import tqdm
+
+import bulk_load
+import copy_loader
+from copy_loader import EDGE_LABEL, VERTEX_LABEL
+from import_v3 import iter_taxonomy_chunks
+
+# Spill files of the partitions live here for the duration of the import
+SPILL_DIR = ".out_of_core"
+
+# Rough peak memory of the dictionary/edge passes per byte of gzipped input of a partition: the
+# text is about 5x larger decompressed, every name then lives in a Python object and in a hash index
+MEMORY_PER_INPUT_BYTE = 36
+
+# Rough peak memory while one chunk of the dumps is parsed, cleaned and spilled: per decoded
+# character of the taxonomy and per row of the popularity file (measured on generated dumps)
+MEMORY_PER_TAXONOMY_CHAR = 18
+MEMORY_PER_POPULARITY_ROW = 450
+
+# Smaller chunks only add per-chunk overhead
+MIN_TAXONOMY_CHUNK_CHARS = 64 * 1024
+MIN_POPULARITY_CHUNK_ROWS = 5_000
+
+# Separates the two fields of a spilled record; page titles can't contain control characters
+# (and "\0" can't be used, numpy drops trailing NULs of the string scalars it concatenates)
+FIELD_SEPARATOR = "\x1f"
+
+
+def count_partitions(taxonomy_path, memory_mb):
+    """Number of partitions for which one partition's names and edges fit in memory_mb"""
+    needed = os.path.getsize(taxonomy_path) * MEMORY_PER_INPUT_BYTE
+    return max(1, math.ceil(needed / (memory_mb * 1024 * 1024)))
+
+
+def chunk_sizes(memory_mb):
+    """(taxonomy chunk chars, popularity chunk rows) whose parsing fits in memory_mb"""
+    budget = memory_mb * 1024 * 1024
+    return (max(MIN_TAXONOMY_CHUNK_CHARS, budget // MEMORY_PER_TAXONOMY_CHAR),
+            max(MIN_POPULARITY_CHUNK_ROWS, budget // MEMORY_PER_POPULARITY_ROW))
+
+
+def name_partitions(names, num_partitions):
+    return (pd.util.hash_array(np.asarray(names, dtype=object)) % np.uint64(num_partitions)).astype(np.int64)
+
+
+class SpillFiles:
+    """One append-only text file per partition, one record per line"""
+
+    def __init__(self, directory, name, num_partitions):
+        os.makedirs(directory, exist_ok=True)
+        self.paths = [os.path.join(directory, f"{name}_{p}.txt") for p in range(num_partitions)]
+        self.files = [open(path, "w", encoding="utf-8", newline="") for path in self.paths]
+
+    def write(self, partitions, records):
+        order = np.argsort(partitions, kind="stable")
+        partitions = partitions[order]
+        records = records[order]
+        bounds = np.searchsorted(partitions, np.arange(len(self.files) + 1))
+        for p, f in enumerate(self.files):
+            if bounds[p] < bounds[p + 1]:
+                f.write("\n".join(records[bounds[p]:bounds[p + 1]]))
+                f.write("\n")
+
+    def close(self):
+        for f in self.files:
+            f.close()
+
+
+def read_spill(path):
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        text = f.read()
+    return text.split("\n")[:-1] if text else []
+
+
+def read_records(path):
+    """The two fields of every record of a spill file"""
+    lines = np.array(read_spill(path), dtype=StringDType())
+    first, _, second = np.strings.partition(lines, np.array(FIELD_SEPARATOR, dtype=StringDType()))
+    return first.astype(object), second.astype(object)
+
+
+def join_records(first, second):
+    return np.asarray(first, dtype=object).astype(str).astype(object) + FIELD_SEPARATOR + np.asarray(second, dtype=object)
+
+
+class CsvSink:
+    """Appends the emitted rows to nodes.csv / edges.csv for the file loader"""
+
+    def __init__(self):
+        pd.DataFrame(columns=['id', 'name', 'popularity']).to_csv('nodes.csv', index=False)
+        pd.DataFrame(columns=['start_id', 'start_vertex_type', 'end_id', 'end_vertex_type']).to_csv('edges.csv', index=False)
+
+    def write_nodes(self, nodes_df):
+        nodes_df.to_csv('nodes.csv', mode='a', header=False, index=False)
+
+    def write_edges(self, edges_df):
+        edges_df.insert(1, 'start_vertex_type', 'Category')
+        edges_df['end_vertex_type'] = 'Category'
+        edges_df.to_csv('edges.csv', mode='a', header=False, index=False)
+
+    def close(self):
+        print("DataFrames have been exported as 'nodes.csv' and 'edges.csv'.")
+
+
+class CopySink:
+    """Streams the emitted rows into the label tables with COPY FROM STDIN"""
+
+    def __init__(self, conn, bulk=False):
+        self.conn = conn
+        self.conn.autocommit = True
+        self.cursor = conn.cursor()
+        if bulk:
+            bulk_load.apply_bulk_settings(self.cursor)
+        copy_loader.create_graph_labels(self.cursor)
+        if bulk:
+            for table in copy_loader.label_tables(self.cursor):
+                bulk_load.set_unlogged(self.cursor, table)
+        self.conn.autocommit = False
+        self.last_node_id = 0
+        self.num_edges = 0
+
+    def write_nodes(self, nodes_df):
+        copy_loader.copy_vertices(self.cursor, nodes_df)
+        self.last_node_id = max(self.last_node_id, int(nodes_df['id'].max()))
+
+    def write_edges(self, edges_df):
+        copy_loader.copy_edges(self.cursor, edges_df, first_entry_id=self.num_edges + 1)
+        self.num_edges += len(edges_df)
+
+    def close(self):
+        copy_loader.advance_id_sequence(self.cursor, VERTEX_LABEL, self.last_node_id)
+        copy_loader.advance_id_sequence(self.cursor, EDGE_LABEL, self.num_edges)
+        self.conn.commit()
+        self.cursor.close()
+        print("NODES AND EDGES INSERTED SECCESSFULLY.")
+
+
+def spill_taxonomy(taxonomy_path, num_partitions, spill_dir, chunk_chars):
+    """Pass 1: every name goes to its name partition, every edge to the partition of its parent"""
+    names = SpillFiles(spill_dir, "names", num_partitions)
+    edges = SpillFiles(spill_dir, "edges_by_parent", num_partitions)
+    num_edges = 0
+    chunks = iter_taxonomy_chunks(taxonomy_path, chunk_chars)
+    for parents, children in tqdm(chunks, desc="Partitioning taxonomy", unit="chunk"):
+        parents = np.asarray(parents, dtype=object)
+        children = np.asarray(children, dtype=object)
+        parent_partitions = name_partitions(parents, num_partitions)
+        names.write(parent_partitions, parents)
+        names.write(name_partitions(children, num_partitions), children)
+        edges.write(parent_partitions, join_records(parents, children))
+        num_edges += len(parents)
+    names.close()
+    edges.close()
+    return names.paths, edges.paths, num_edges
+
+
+def spill_popularity(popularity_path, num_partitions, spill_dir, chunk_rows):
+    popularity = SpillFiles(spill_dir, "popularity", num_partitions)
+    reader = pd.read_csv(popularity_path, compression='gzip', header=None, names=["node_name", "page_views"],
+                         chunksize=chunk_rows)
+    for chunk in reader:
+        chunk = chunk.dropna(subset=['node_name']).astype({'node_name': object})
+        # Missing page views count as 0, like in the in-memory import
+        chunk['page_views'] = chunk['page_views'].fillna(0)
+        node_names = chunk['node_name'].to_numpy(dtype=object)
+        popularity.write(name_partitions(node_names, num_partitions), join_records(chunk['page_views'], node_names))
+    popularity.close()
+    return popularity.paths
+
+
+def build_dictionary(name_paths, popularity_paths, spill_dir, sink):
+    """Pass 2: numbers the distinct names partition by partition and emits the nodes with their popularity
+
+    Returns the first id of every partition; the distinct names are rewritten in id order.
+    """
+    first_ids = []
+    next_id = 1
+    for p, path in enumerate(tqdm(name_paths, desc="Building node dictionary", unit="partition")):
+        names = pd.unique(np.array(read_spill(path), dtype=object))
+        first_ids.append(next_id)
+        with open(os.path.join(spill_dir, f"dictionary_{p}.txt"), "w", encoding="utf-8", newline="") as f:
+            f.write("".join(name + "\n" for name in names))
+
+        popularity = np.zeros(len(names), dtype=np.float64)
+        views, popularity_names = read_records(popularity_paths[p])
+        codes = pd.Index(names).get_indexer(popularity_names)
+        matched = codes >= 0
+        popularity[codes[matched]] = views[matched].astype(np.float64)
+
+        if len(names):
+            sink.write_nodes(pd.DataFrame({
+                'id': np.arange(next_id, next_id + len(names), dtype=np.int64),
+                'name': names,
+                'popularity': popularity,
+            }))
+        next_id += len(names)
+        os.remove(path)
+    return first_ids
+
+
+def dictionary_ids(spill_dir, p, first_id, names):
+    dictionary = pd.Index(read_spill(os.path.join(spill_dir, f"dictionary_{p}.txt")), dtype=object)
+    return dictionary.get_indexer(names) + first_id
+
+
+def resolve_edges(edge_paths, first_ids, num_partitions, spill_dir, sink):
+    """Pass 3: start ids from the parents' partitions, re-spilled by child; end ids from the children's"""
+    by_child = SpillFiles(spill_dir, "edges_by_child", num_partitions)
+    for p, path in enumerate(tqdm(edge_paths, desc="Resolving edge starts", unit="partition")):
+        parents, children = read_records(path)
+        start_ids = dictionary_ids(spill_dir, p, first_ids[p], parents)
+        by_child.write(name_partitions(children, num_partitions), join_records(start_ids, children))
+        os.remove(path)
+    by_child.close()
+
+    for q, path in enumerate(tqdm(by_child.paths, desc="Resolving edge ends", unit="partition")):
+        start_ids, children = read_records(path)
+        if len(children):
+            sink.write_edges(pd.DataFrame({
+                'start_id': start_ids.astype(np.int64),
+                'end_id': dictionary_ids(spill_dir, q, first_ids[q], children),
+            }))
+        os.remove(path)
+
+
+def run(taxonomy_path, popularity_path, memory_mb, sink, spill_dir=SPILL_DIR):
+    """Imports the dumps holding at most one partition of names/edges in memory at a time"""
+    num_partitions = count_partitions(taxonomy_path, memory_mb)
+    chunk_chars, chunk_rows = chunk_sizes(memory_mb)
+    print(f"Importing out of core in {num_partitions} partitions (memory budget {memory_mb} MB)...")
+    shutil.rmtree(spill_dir, ignore_errors=True)
+    try:
+        name_paths, edge_paths, num_edges = spill_taxonomy(taxonomy_path, num_partitions, spill_dir, chunk_chars)
+        popularity_paths = spill_popularity(popularity_path, num_partitions, spill_dir, chunk_rows)
+        first_ids = build_dictionary(name_paths, popularity_paths, spill_dir, sink)
+        resolve_edges(edge_paths, first_ids, num_partitions, spill_dir, sink)
+        sink.close()
+        print(f"Number of rows in taxonomy: {num_edges}")
+    finally:
+        shutil.rmtree(spill_dir, ignore_errors=True)
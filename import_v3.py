@@ -1,8 +1,22 @@
 import pandas as pd
+import numpy as np
+import re
+import operator
 import gzip
 import psycopg2
 import os
 import subprocess
+import argparse
+import time
+from itertools import repeat
+from numpy.dtypes import StringDType
+from tqdm import tqdm
+
+import bulk_load
+import copy_loader
+import graph_indexes
+import parse_cache
+import result_cache
 
 # Paths to the data files
 POPULARITY_PATH = "popularity_iw.csv.gz"
@@ -11,38 +25,115 @@ TAXONOMY_PATH = "taxonomy_iw.csv.gz"
 # Docker container and file paths
 DOCKER_CONTAINER = "age-container"
 
+# Database connection parameters
+DB_PARAMS = {
+    "dbname": os.getenv("DB_NAME", "postgres"),
+    "user": os.getenv("DB_USER", "postgres"),
+    "password": os.getenv("DB_PASSWORD", "root"),
+    "host": os.getenv("DB_HOST", "localhost"),
+    "port": int(os.getenv("DB_PORT", 5432)),
+}
+
+# Bump when the parsing changes, so that cached data from the old parser is not reused
+POPULARITY_PARSER_VERSION = 1
+TAXONOMY_PARSER_VERSION = 2
+
 # Process the popularity data
 def process_popularity():
-    pickle_path = "processed_popularity.pkl"
-    if os.path.exists(pickle_path):
-        print("Loading popularity data from pickle...")
-        df = pd.read_pickle(pickle_path)
+    df = parse_cache.load(POPULARITY_PATH, POPULARITY_PARSER_VERSION)
+    if df is not None:
+        print("Loading popularity data from cache...")
     else:
         print("Processing popularity data...")
-        df = pd.read_csv(POPULARITY_PATH, compression='gzip', header=None, names=["node_name", "page_views"])
-        df.to_pickle(pickle_path)
+        df = parse_popularity(POPULARITY_PATH)
+        parse_cache.store(POPULARITY_PATH, POPULARITY_PARSER_VERSION, df)
+        df = parse_cache.load(POPULARITY_PATH, POPULARITY_PARSER_VERSION)
     return df
 
+def parse_popularity(path):
+    return pd.read_csv(path, compression='gzip', header=None, names=["node_name", "page_views"])
+
 # Process the taxonomy data
 def process_taxonomy():
-    pickle_path = "processed_taxonomy.pkl"
-    if os.path.exists(pickle_path):
-        print("Loading taxonomy data from pickle...")
-        df = pd.read_pickle(pickle_path)
+    df = parse_cache.load(TAXONOMY_PATH, TAXONOMY_PARSER_VERSION)
+    if df is not None:
+        print("Loading taxonomy data from cache...")
     else:
         print("Processing taxonomy data...")
-        graph_tuples = []
-        with gzip.open(TAXONOMY_PATH, 'rt', encoding='utf-8') as f:
-            for line in f:
-                comma_index = get_comma_index_not_in_quotes(line)
-                if comma_index != -1:
-                    parent = line[:comma_index]
-                    child = line[comma_index + 1:].strip()
-                    graph_tuples.append((parent, child))
-        df = pd.DataFrame(graph_tuples, columns=['from', 'to'])
-        df['from'] = df['from'].map(remove_quotes_from_string)
-        df['to'] = df['to'].map(remove_quotes_from_string)
-        df.to_pickle(pickle_path)
+        df = parse_taxonomy(TAXONOMY_PATH)
+        parse_cache.store(TAXONOMY_PATH, TAXONOMY_PARSER_VERSION, df)
+        df = parse_cache.load(TAXONOMY_PATH, TAXONOMY_PARSER_VERSION)
+    return df
+
+# Number of characters decoded from the gzip stream per parsed chunk
+TAXONOMY_CHUNK_CHARS = 16 * 1024 * 1024
+
+# Everything up to the first comma that is not inside quotes, and the rest of the line
+FIRST_UNQUOTED_COMMA = re.compile(r'^((?:[^",]|"[^"]*")*),(.*)$')
+
+def parse_taxonomy(path):
+    parents = []
+    children = []
+    for chunk_parents, chunk_children in iter_taxonomy_chunks(path):
+        parents.append(chunk_parents)
+        children.append(chunk_children)
+    return pd.DataFrame({
+        'from': np.concatenate(parents) if parents else np.array([], dtype=object),
+        'to': np.concatenate(children) if children else np.array([], dtype=object),
+    })
+
+def iter_taxonomy_chunks(path, chunk_chars=TAXONOMY_CHUNK_CHARS):
+    """Yields (parents, children) arrays for consecutive chunks of the taxonomy file"""
+    remainder = ''
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        while True:
+            block = f.read(chunk_chars)
+            if not block:
+                break
+            block = remainder + block
+            cut = block.rfind('\n')
+            if cut == -1:
+                remainder = block
+                continue
+            remainder = block[cut + 1:]
+            yield split_taxonomy_lines(block[:cut].split('\n'))
+    if remainder:
+        yield split_taxonomy_lines([remainder])
+
+def split_taxonomy_lines(lines):
+    # Same split as get_comma_index_not_in_quotes + remove_quotes_from_string,
+    # done with numpy's C string ufuncs over the whole chunk
+    quoted = np.fromiter(map(operator.contains, lines, repeat('"')), dtype=bool, count=len(lines))
+    lines = np.array(lines, dtype=StringDType())
+    parent, sep, child = np.strings.partition(lines, np.array(',', dtype=StringDType()))
+    found = sep == ','
+    child = np.strings.strip(child)
+
+    # Lines without quotes can simply be split at their first comma,
+    # only the (rare) quoted ones need the quote-aware pattern
+    for i in np.flatnonzero(quoted):
+        match = FIRST_UNQUOTED_COMMA.match(str(lines[i]))
+        found[i] = match is not None
+        if match:
+            parent[i] = remove_quotes_from_string(match.group(1)) if match.group(1) else ''
+            stripped = match.group(2).strip()
+            child[i] = remove_quotes_from_string(stripped) if stripped else ''
+
+    return parent[found].astype(object), child[found].astype(object)
+
+# Original line-by-line parser, kept as the reference for scripts/bench_taxonomy_parser.py
+def parse_taxonomy_per_line(path):
+    graph_tuples = []
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            comma_index = get_comma_index_not_in_quotes(line)
+            if comma_index != -1:
+                parent = line[:comma_index]
+                child = line[comma_index + 1:].strip()
+                graph_tuples.append((parent, child))
+    df = pd.DataFrame(graph_tuples, columns=['from', 'to'])
+    df['from'] = df['from'].map(remove_quotes_from_string)
+    df['to'] = df['to'].map(remove_quotes_from_string)
     return df
 
 # Helper functions
@@ -66,55 +157,51 @@ def count_rows(popularity_df, taxonomy_df):
     print(f"Number of rows in popularity DataFrame: {len(popularity_df)}")
     print(f"Number of rows in taxonomy DataFrame: {len(taxonomy_df)}")
 
-def clean_data(dataframe, columns):
-    for col in columns:
-        dataframe[col] = dataframe[col].str.replace("'", "-", regex=False)  # Remove single quotes
-        dataframe[col] = dataframe[col].str.replace("$", "S", regex=False)  # Replace $ with S
-    return dataframe
-
-
-
-
-def make_age_compatable_df(taxonomy_df):
-    # Step 1: Create a unique list of all nodes from `from` and `to` columns
-    all_nodes = pd.unique(taxonomy_df[['from', 'to']].values.ravel())
-
-    # Step 2: Create a mapping of node names to IDs
-    node_mapping = {node: idx for idx, node in enumerate(all_nodes, start=1)}
-
-    # Step 3: Create nodes_df with ID and Name
+def factorize_names(names):
+    # (code of every row, distinct names); dictionary encoded columns already are that. Their
+    # codes are as narrow as the number of categories allows (int8/int16), so they are widened
+    # before any offset is added to them
+    if isinstance(names.dtype, pd.CategoricalDtype):
+        return names.cat.codes.to_numpy().astype(np.int64), names.cat.categories.to_numpy(dtype=object)
+    codes, uniques = pd.factorize(names)
+    return codes, np.asarray(uniques, dtype=object)
+
+def make_age_compatable_df(taxonomy_df, popularity_df):
+    # Step 1: Number all nodes from `from` and `to` columns; only the distinct names of each
+    # column are hashed, the codes of both ends of every edge follow from them
+    from_codes, from_names = factorize_names(taxonomy_df['from'])
+    to_codes, to_names = factorize_names(taxonomy_df['to'])
+    name_codes, all_nodes = pd.factorize(np.concatenate([from_names, to_names]))
+    id_dtype = np.int32 if len(all_nodes) < np.iinfo(np.int32).max else np.int64
+    name_codes = name_codes.astype(id_dtype)
+    start_codes = name_codes[from_codes]
+    end_codes = name_codes[len(from_names) + to_codes]
+
+    # Step 2: Join popularity by node code, nodes without popularity data get 0
+    popularity = np.zeros(len(all_nodes), dtype=np.float64)
+    row_codes, popularity_names = factorize_names(popularity_df['node_name'])
+    popularity_codes = pd.Index(all_nodes).get_indexer(popularity_names)[row_codes]
+    matched = (row_codes >= 0) & (popularity_codes >= 0)
+    # Missing page views count as 0 too, NaN is not a valid agtype value
+    page_views = np.nan_to_num(popularity_df['page_views'].to_numpy(dtype=np.float64), nan=0.0)
+    popularity[popularity_codes[matched]] = page_views[matched]
+
+    # Step 3: Create nodes_df with ID, Name and Popularity
     nodes_df = pd.DataFrame({
-        'id': [node_mapping[node] for node in all_nodes],
-        'name': all_nodes
+        'id': np.arange(1, len(all_nodes) + 1, dtype=id_dtype),
+        'name': all_nodes,
+        'popularity': popularity,
     })
 
-    # Step 4: Create edges_df
-    edges_df = taxonomy_df.copy()
-    edges_df['start_id'] = edges_df['from'].map(node_mapping)
-    edges_df['end_id'] = edges_df['to'].map(node_mapping)
-    edges_df['start_vertex_type'] = 'Category'
-    edges_df['end_vertex_type'] = 'Category'
-
-    # Keep only the required columns
-    edges_df = edges_df[['start_id', 'start_vertex_type', 'end_id', 'end_vertex_type']]
-
-
-    # Merge popularity data into nodes_df
-    nodes_df = nodes_df.merge(
-        popularity_df,
-        how='left',  # Use left join to keep all nodes even if they don't have popularity data
-        left_on='name',  # Match `name` in nodes_df
-        right_on='node_name'  # Match `node_name` in popularity_df
-    )
-
-    # Drop the redundant node_name column (optional)
-    nodes_df = nodes_df.drop(columns=['node_name'])
-
-    # Rename page_views to popularity for clarity
-    nodes_df = nodes_df.rename(columns={'page_views': 'popularity'})
-
-    # Fill NaN values in popularity with 0
-    nodes_df['popularity'] = nodes_df['popularity'].fillna(0)
+    # Step 4: Create edges_df, the vertex type is the same for every row so it is
+    # kept as a single-category column instead of a string per row
+    vertex_type = pd.Categorical.from_codes(np.zeros(len(start_codes), dtype=np.int8), categories=['Category'])
+    edges_df = pd.DataFrame({
+        'start_id': start_codes + 1,
+        'start_vertex_type': vertex_type,
+        'end_id': end_codes + 1,
+        'end_vertex_type': vertex_type,
+    })
 
     print(edges_df.head())
     print(nodes_df.head())
@@ -122,15 +209,26 @@ def make_age_compatable_df(taxonomy_df):
     print(f"Number of rows in edges_df DataFrame: {len(edges_df)}")
     print(f"Number of rows in nodes_df DataFrame: {len(nodes_df)}")
 
+    return nodes_df, edges_df
+
+def export_age_csv(nodes_df, edges_df, edge_partitions=1):
     # Export nodes_df to a CSV file
     nodes_df.to_csv('nodes.csv', index=False)
 
-    # Export edges_df to a CSV file
-    edges_df.to_csv('edges.csv', index=False)
+    # Export edges_df to a CSV file, or to one file per partition when they are loaded in parallel
+    edge_files = edge_file_names(edge_partitions)
+    bounds = copy_loader.partition_bounds(len(edges_df), edge_partitions)
+    for i, edge_file in enumerate(edge_files):
+        edges_df.iloc[bounds[i]:bounds[i + 1]].to_csv(edge_file, index=False)
 
-    print("DataFrames have been exported as 'nodes.csv' and 'edges.csv'.")
+    print(f"DataFrames have been exported as 'nodes.csv' and {', '.join(repr(f) for f in edge_files)}.")
 
-def copy_data_into_container():
+def edge_file_names(edge_partitions):
+    if edge_partitions == 1:
+        return ['edges.csv']
+    return [f'edges_{i}.csv' for i in range(edge_partitions)]
+
+def copy_data_into_container(edge_partitions=1):
     docker_container = "age-container"
     docker_target_dir = "/age/regress/age_load/data/project"
 
@@ -146,21 +244,16 @@ def copy_data_into_container():
         ["docker", "cp", "nodes.csv", f"{docker_container}:{docker_target_dir}/nodes.csv"],
         check=True
     )
-    subprocess.run(
-        ["docker", "cp", "edges.csv", f"{docker_container}:{docker_target_dir}/edges.csv"],
-        check=True
-    )
+    for edge_file in edge_file_names(edge_partitions):
+        subprocess.run(
+            ["docker", "cp", edge_file, f"{docker_container}:{docker_target_dir}/{edge_file}"],
+            check=True
+        )
 
-    print(f"Copied nodes.csv and edges.csv to {docker_target_dir} in Docker container {docker_container}.")
+    print(f"Copied nodes.csv and edges files to {docker_target_dir} in Docker container {docker_container}.")
 
-def insert_data_into_db():
-    db_params = {
-        "dbname": os.getenv("DB_NAME", "postgres"),
-        "user": os.getenv("DB_USER", "postgres"),
-        "password": os.getenv("DB_PASSWORD", "root"),
-        "host": os.getenv("DB_HOST", "localhost"),
-        "port": int(os.getenv("DB_PORT", 5432)),
-    }    
+def insert_data_into_db(edge_workers=1, bulk=False):
+    db_params = DB_PARAMS
     try:
         # Connect to the PostgreSQL database
         conn = psycopg2.connect(**db_params)
@@ -172,6 +265,9 @@ def insert_data_into_db():
         cursor.execute("SET search_path TO ag_catalog;")
         cursor.execute("SELECT create_graph('iw_graph');")
         cursor.execute("SELECT create_vlabel('iw_graph', 'Category');")
+        if bulk:
+            bulk_load.apply_bulk_settings(cursor)
+            bulk_load.set_unlogged(cursor, 'iw_graph."Category"')
         cursor.execute("""
             SELECT load_labels_from_file(
                 'iw_graph',
@@ -200,13 +296,19 @@ def insert_data_into_db():
         cursor.execute("LOAD 'age';")
         cursor.execute("SET search_path TO ag_catalog;")
         cursor.execute("SELECT create_elabel('iw_graph', 'has');")
-        cursor.execute("""
-            SELECT load_edges_from_file(
-                'iw_graph',
-                'has',
-                '/age/regress/age_load/data/project/edges.csv'
-            );
-        """)
+        if bulk:
+            bulk_load.apply_bulk_settings(cursor)
+            bulk_load.set_unlogged(cursor, 'iw_graph.has')
+        if edge_workers > 1:
+            load_edge_files_parallel(db_params, edge_workers, bulk)
+        else:
+            cursor.execute("""
+                SELECT load_edges_from_file(
+                    'iw_graph',
+                    'has',
+                    '/age/regress/age_load/data/project/edges.csv'
+                );
+            """)
 
         print("EDGES INSERTED SECCESSFULLY.")
     except Exception as e:
@@ -217,20 +319,140 @@ def insert_data_into_db():
             cursor.close()
             conn.close()
 
+def load_edge_files_parallel(db_params, edge_workers, bulk=False):
+    # Every partition file is loaded by its own connection, all at the same time
+    edge_files = edge_file_names(edge_workers)
+    progress = tqdm(total=edge_workers, desc="Loading edge partitions", unit="partition")
+
+    def load_partition(i):
+        start = time.perf_counter()
+        conn = psycopg2.connect(**db_params)
+        conn.autocommit = True
+        try:
+            cursor = conn.cursor()
+            cursor.execute("LOAD 'age';")
+            cursor.execute("SET search_path TO ag_catalog;")
+            if bulk:
+                bulk_load.apply_bulk_settings(cursor)
+            cursor.execute(
+                "SELECT load_edges_from_file('iw_graph', 'has', %s);",
+                (f"/age/regress/age_load/data/project/{edge_files[i]}",)
+            )
+        finally:
+            conn.close()
+        progress.write(f"Edge partition {i} ({edge_files[i]}) loaded in {time.perf_counter() - start:.1f} s")
+        progress.update(1)
+
+    try:
+        copy_loader.run_partitions(load_partition, edge_workers)
+    finally:
+        progress.close()
+
+def copy_data_into_db(nodes_df, edges_df, edge_workers=1, bulk=False):
+    try:
+        copy_loader.copy_graph(lambda: psycopg2.connect(**DB_PARAMS), nodes_df, edges_df, edge_workers, bulk=bulk)
+    except Exception as e:
+        print(f"An error occurred while copying the graph: {e}")
+
+def restore_durability():
+    conn = None
+    try:
+        conn = psycopg2.connect(**DB_PARAMS)
+        conn.autocommit = True
+        bulk_load.restore_durability(conn.cursor(), ['iw_graph."Category"', 'iw_graph.has'])
+    except Exception as e:
+        print(f"An error occurred while making the label tables logged: {e}")
+    finally:
+        if conn:
+            conn.close()
+
+def bump_graph_generation():
+    # Cached dbcli results of the previous graph are stale now
+    conn = None
+    try:
+        conn = psycopg2.connect(**DB_PARAMS)
+        conn.autocommit = True
+        result_cache.bump_generation(conn.cursor())
+    except Exception as e:
+        print(f"An error occurred while bumping the graph generation: {e}")
+    finally:
+        if conn:
+            conn.close()
+
+def create_indexes(gin=False, bulk=False):
+    conn = None
+    try:
+        conn = psycopg2.connect(**DB_PARAMS)
+        if bulk:
+            bulk_load.apply_bulk_settings(conn.cursor())
+        graph_indexes.build_indexes(conn, gin)
+        print("INDEXES CREATED SECCESSFULLY.")
+    except Exception as e:
+        print(f"An error occurred while creating indexes: {e}")
+    finally:
+        if conn:
+            conn.close()
+
 # Main execution flow
 if __name__ == "__main__":
-    popularity_df = process_popularity()
-    taxonomy_df = process_taxonomy()
+    parser = argparse.ArgumentParser(description="Imports the Wikipedia taxonomy into the iw_graph AGE graph")
+    parser.add_argument(
+        "--loader", choices=["file", "copy"], default="file",
+        help="file: export nodes.csv/edges.csv and load them from the server's path, "
+             "copy: stream the rows from this client with COPY FROM STDIN, no files needed",
+    )
+    parser.add_argument(
+        "--edge-workers", type=int, default=1,
+        help="split the edges into this many partitions and load them concurrently, one connection each",
+    )
+    parser.add_argument("--no-indexes", action="store_true", help="skip building the lookup indexes after the load")
+    parser.add_argument("--gin-index", action="store_true", help="also build a GIN index on the Category properties")
+    parser.add_argument(
+        "--bulk", action="store_true",
+        help="load into UNLOGGED label tables with bulk session settings, make them logged again before indexing",
+    )
+    parser.add_argument(
+        "--memory-mb", type=int, default=None,
+        help="import out of core: partition the dumps on disk so the import stays within about this much memory",
+    )
+    args = parser.parse_args()
+
+    load_start = time.perf_counter()
+    if args.memory_mb:
+        import import_out_of_core
+
+        if args.loader == "copy":
+            conn = psycopg2.connect(**DB_PARAMS)
+            try:
+                import_out_of_core.run(TAXONOMY_PATH, POPULARITY_PATH, args.memory_mb,
+                                       import_out_of_core.CopySink(conn, args.bulk))
+            finally:
+                conn.close()
+        else:
+            import_out_of_core.run(TAXONOMY_PATH, POPULARITY_PATH, args.memory_mb, import_out_of_core.CsvSink())
+            insert_data_into_db(bulk=args.bulk)
+    else:
+        popularity_df = process_popularity()
+        taxonomy_df = process_taxonomy()
+
+        count_rows(popularity_df, taxonomy_df)
+
+        nodes_df, edges_df = make_age_compatable_df(taxonomy_df, popularity_df)
 
-    # Clean the data
-    popularity_df = clean_data(popularity_df, ["node_name"])
-    taxonomy_df = clean_data(taxonomy_df, ["from", "to"])
+        load_start = time.perf_counter()
+        if args.loader == "copy":
+            copy_data_into_db(nodes_df, edges_df, args.edge_workers, args.bulk)
+        else:
+            export_age_csv(nodes_df, edges_df, args.edge_workers)
 
-    count_rows(popularity_df, taxonomy_df)
+#            copy_data_into_container(args.edge_workers)
 
-    make_age_compatable_df(taxonomy_df)
+            insert_data_into_db(args.edge_workers, args.bulk)
 
-#    copy_data_into_container()
+    if args.bulk:
+        restore_durability()
+    print(f"Graph loaded in {time.perf_counter() - load_start:.1f} s{' (bulk mode)' if args.bulk else ''}.")
+    bump_graph_generation()
 
-    insert_data_into_db()
-    
+    if not args.no_indexes:
+        create_indexes(args.gin_index, args.bulk)
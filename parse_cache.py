@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+# Parsed data files are cached here, one directory per (source file, parser version, content hash)
+CACHE_DIR = ".parse_cache"
+
+# How many cached generations of the same source file are kept on disk
+KEEP_GENERATIONS = 2
+
+# Separator of the values in a string column file; it can't appear in a Postgres text value
+STRING_SEPARATOR = "\0"
+
+HASH_BLOCK_SIZE = 8 * 1024 * 1024
+
+
+def source_digest(path):
+    """Content hash of the source file, remembered per (size, mtime) so unchanged dumps aren't re-hashed"""
+    stat = os.stat(path)
+    stamp = f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+    digests_path = os.path.join(CACHE_DIR, "digests.json")
+    digests = {}
+    if os.path.exists(digests_path):
+        with open(digests_path, "r") as f:
+            digests = json.load(f)
+    if stamp in digests:
+        return digests[stamp]
+
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            h.update(block)
+    digest = h.hexdigest()
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    digests = {k: v for k, v in digests.items() if not k.startswith(f"{os.path.abspath(path)}:")}
+    digests[stamp] = digest
+    with open(digests_path, "w") as f:
+        json.dump(digests, f)
+    return digest
+
+
+def _generation_prefix(path):
+    return os.path.basename(path).split(".")[0] + "-"
+
+
+def _generation_dir(path, parser_version):
+    return os.path.join(CACHE_DIR, f"{_generation_prefix(path)}v{parser_version}-{source_digest(path)}")
+
+
+def load(path, parser_version, columns=None):
+    """Returns the cached DataFrame parsed from `path`, or None if this exact file wasn't cached yet
+
+    String columns come back as pandas Categoricals.
+    """
+    gen_dir = _generation_dir(path, parser_version)
+    meta_path = os.path.join(gen_dir, "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, "r") as f:
+        meta = json.load(f)
+
+    data = {}
+    for col in columns or meta["columns"]:
+        data[col] = _read_column(gen_dir, meta["columns"].index(col), meta["kinds"][col])
+    return pd.DataFrame(data, copy=False)
+
+
+def store(path, parser_version, df):
+    """Writes the columns of `df` as the cache generation of `path` and evicts the old ones"""
+    gen_dir = _generation_dir(path, parser_version)
+    tmp_dir = gen_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    kinds = {col: _write_column(tmp_dir, i, df[col]) for i, col in enumerate(df.columns)}
+
+    with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+        json.dump({"source": os.path.abspath(path), "rows": len(df),
+                   "columns": list(df.columns), "kinds": kinds}, f)
+
+    shutil.rmtree(gen_dir, ignore_errors=True)
+    os.replace(tmp_dir, gen_dir)
+    evict(path)
+
+
+def _generation_source(gen_dir):
+    """Absolute path of the source file a cache generation was parsed from, None if it has no metadata"""
+    meta_path = os.path.join(gen_dir, "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, "r") as f:
+        return json.load(f).get("source")
+
+
+def evict(path, keep=KEEP_GENERATIONS):
+    """Removes all but the `keep` most recent cache generations of `path`
+
+    Generations are matched by the source path in their metadata, not by their directory name,
+    so another dump with the same file name (a generated or benchmark one) never evicts them.
+    """
+    if not os.path.isdir(CACHE_DIR):
+        return
+    source = os.path.abspath(path)
+    generations = [
+        os.path.join(CACHE_DIR, name) for name in os.listdir(CACHE_DIR)
+        if os.path.isdir(os.path.join(CACHE_DIR, name))
+        and _generation_source(os.path.join(CACHE_DIR, name)) == source
+    ]
+    generations.sort(key=os.path.getmtime, reverse=True)
+    for old in generations[keep:]:
+        print(f"Evicting cached data {old}")
+        shutil.rmtree(old, ignore_errors=True)
+
+
+def _write_column(gen_dir, i, series):
+    if pd.api.types.is_numeric_dtype(series.dtype):
+        np.save(os.path.join(gen_dir, f"{i}.npy"), series.to_numpy())
+        return {"kind": "numeric"}
+
+    # Names repeat a lot (every category is in many edges), so string columns
+    # are stored dictionary encoded: the distinct values plus one code per row
+    codes, uniques = pd.factorize(series)
+    code_dtype = np.int32 if len(uniques) < np.iinfo(np.int32).max else np.int64
+    np.save(os.path.join(gen_dir, f"{i}.codes.npy"), codes.astype(code_dtype))
+    with open(os.path.join(gen_dir, f"{i}.str"), "w", encoding="utf-8", newline="") as f:
+        f.write(STRING_SEPARATOR.join(uniques.tolist()))
+    return {"kind": "string", "uniques": len(uniques)}
+
+
+def _read_column(gen_dir, i, kind):
+    if kind["kind"] == "numeric":
+        return np.load(os.path.join(gen_dir, f"{i}.npy"), mmap_mode="r")
+
+    codes = np.load(os.path.join(gen_dir, f"{i}.codes.npy"), mmap_mode="r")
+    with open(os.path.join(gen_dir, f"{i}.str"), "r", encoding="utf-8", newline="") as f:
+        uniques = f.read().split(STRING_SEPARATOR) if kind["uniques"] else []
+
+    # Kept dictionary encoded in memory too, missing values have code -1
+    return pd.Categorical.from_codes(codes, categories=uniques)
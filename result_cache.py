@@ -0,0 +1,116 @@
+import os
+import pickle
+import time
+from collections import OrderedDict
+
+import psycopg2.errors
+
+GRAPH_NAME = "iw_graph"
+
+# One row per graph, bumped by every import and every write task; cached results of an
+# older generation are never served
+GENERATION_TABLE = "public.graph_generation"
+
+MAX_ENTRIES = 1024
+
+# Outputs longer than this are printed but not cached
+MAX_ENTRY_CHARS = 1_000_000
+
+
+def read_generation(cursor, graph_name=GRAPH_NAME):
+    try:
+        cursor.execute(f"SELECT generation FROM {GENERATION_TABLE} WHERE graph_name = %s;", (graph_name,))
+    except psycopg2.errors.UndefinedTable:
+        # Nothing bumped it yet
+        if not cursor.connection.autocommit:
+            cursor.connection.rollback()
+        return 0
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def bump_generation(cursor, graph_name=GRAPH_NAME):
+    """Marks every cached result of the graph stale; call it in the transaction that changes the graph"""
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {GENERATION_TABLE} (graph_name text PRIMARY KEY, generation bigint NOT NULL);
+    """)
+    cursor.execute(f"""
+        INSERT INTO {GENERATION_TABLE} (graph_name, generation) VALUES (%s, 1)
+        ON CONFLICT (graph_name) DO UPDATE SET generation = {GENERATION_TABLE}.generation + 1;
+    """, (graph_name,))
+
+
+class ResultCache:
+    """LRU cache of task results with an optional TTL, optionally kept in a file between runs"""
+
+    def __init__(self, max_entries=MAX_ENTRIES, ttl=None, path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        # key -> (time stored, value), least recently used first
+        self.entries = OrderedDict()
+        if path and os.path.exists(path):
+            self.load()
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        stored_at, value = entry
+        if self.ttl is not None and time.time() - stored_at > self.ttl:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = (time.time(), value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+    def load(self):
+        try:
+            with open(self.path, "rb") as f:
+                self.entries = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            # A broken cache file only costs the cached results
+            self.entries = OrderedDict()
+
+    def save(self):
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(self.entries, f)
+        os.replace(tmp_path, self.path)
+
+
+class TeeOutput:
+    """Writes through to `out` and keeps a copy of what was written, up to MAX_ENTRY_CHARS"""
+
+    def __init__(self, out):
+        self.out = out
+        self.parts = []
+        self.size = 0
+        self.complete = True
+
+    def write(self, text):
+        self.out.write(text)
+        if self.complete:
+            self.size += len(text)
+            if self.size > MAX_ENTRY_CHARS:
+                self.complete = False
+                self.parts = []
+            else:
+                self.parts.append(text)
+        return len(text)
+
+    def flush(self):
+        self.out.flush()
+
+    def getvalue(self):
+        return "".join(self.parts) if self.complete else None
@@ -0,0 +1,220 @@
+import argparse
+import contextlib
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+import psycopg2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bulk_load
+import copy_loader
+import parse_cache
+from import_v3 import (DB_PARAMS, export_age_csv, make_age_compatable_df, process_popularity,
+                       process_taxonomy)
+from scripts.generate_taxonomy import generate, parse_scale
+
+# The benchmark loads into its own graph so that iw_graph is never touched
+BENCH_GRAPH = "iw_graph_bench"
+
+
+def proc_status_mb(field):
+    # VmRSS (current) / VmHWM (peak) of this process, None where /proc isn't available
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def current_rss_mb():
+    rss = proc_status_mb("VmRSS")
+    return rss if rss is not None else resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def reset_peak_rss():
+    """Restarts the VmHWM peak from the current RSS (Linux), so it covers one stage only"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+class StageTimer:
+    def __init__(self):
+        self.stages = []
+
+    def run(self, name, rows, fn, *args, **kwargs):
+        start_rss = current_rss_mb()
+        peak_reset = reset_peak_rss()
+        start = time.perf_counter()
+        # Keep stdout for the JSON result
+        with contextlib.redirect_stdout(sys.stderr):
+            result = fn(*args, **kwargs)
+        seconds = time.perf_counter() - start
+        row_count = rows(result) if callable(rows) else rows
+        peak = proc_status_mb("VmHWM") if peak_reset else None
+        self.stages.append({
+            "stage": name,
+            "seconds": round(seconds, 3),
+            "rows": row_count,
+            "rows_per_s": round(row_count / seconds) if seconds > 0 else None,
+            # Memory the stage kept, and the most it used on top of what was there when it started
+            "rss_delta_mb": round(current_rss_mb() - start_rss, 1),
+            "peak_rss_increase_mb": round(peak - start_rss, 1) if peak is not None else None,
+        })
+        print(f"[{name}] {seconds:.2f} s, {row_count} rows", file=sys.stderr)
+        return result
+
+
+def drop_graph(cursor, graph_name):
+    cursor.execute("LOAD 'age';")
+    cursor.execute("SET search_path TO ag_catalog;")
+    cursor.execute("SELECT count(*) FROM ag_catalog.ag_graph WHERE name = %s;", (graph_name,))
+    if cursor.fetchone()[0]:
+        cursor.execute("SELECT drop_graph(%s, true);", (graph_name,))
+
+
+def bulk_connect(connect):
+    def connect_with_settings():
+        conn = connect()
+        bulk_load.apply_bulk_settings(conn.cursor())
+        return conn
+    return connect_with_settings
+
+
+def load_nodes(connect, nodes_df, bulk=False):
+    conn = connect()
+    try:
+        conn.autocommit = True
+        cursor = conn.cursor()
+        drop_graph(cursor, BENCH_GRAPH)
+        copy_loader.create_graph_labels(cursor, BENCH_GRAPH)
+        if bulk:
+            for table in copy_loader.label_tables(cursor, BENCH_GRAPH):
+                bulk_load.set_unlogged(cursor, table)
+        conn.autocommit = False
+        copy_loader.copy_vertices(cursor, nodes_df, graph_name=BENCH_GRAPH)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def load_edges(connect, edges_df, edge_workers):
+    if edge_workers > 1:
+        copy_loader.copy_edges_parallel(connect, edges_df, edge_workers, BENCH_GRAPH)
+        return
+    conn = connect()
+    try:
+        copy_loader.copy_edges(conn.cursor(), edges_df, graph_name=BENCH_GRAPH)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def set_logged(connect):
+    conn = connect()
+    try:
+        conn.autocommit = True
+        cursor = conn.cursor()
+        bulk_load.restore_durability(cursor, copy_loader.label_tables(cursor, BENCH_GRAPH))
+    finally:
+        conn.close()
+
+
+def stage_seconds(stages, names):
+    return sum(stage["seconds"] for stage in stages if stage["stage"] in names)
+
+
+def run(data_dir, use_db=True, edge_workers=1, keep_graph=False, compare_bulk=False):
+    timer = StageTimer()
+
+    # The dumps are read the way import_v3 reads them: through the parse cache, so the later
+    # stages get its dictionary encoded columns. The first read parses and fills the cache,
+    # the second one is a warm start
+    cwd = os.getcwd()
+    os.chdir(data_dir)
+    try:
+        shutil.rmtree(parse_cache.CACHE_DIR, ignore_errors=True)
+        timer.run("parse_taxonomy", len, process_taxonomy)
+        timer.run("parse_popularity", len, process_popularity)
+        taxonomy_df = timer.run("cached_taxonomy", len, process_taxonomy)
+        popularity_df = timer.run("cached_popularity", len, process_popularity)
+    finally:
+        os.chdir(cwd)
+
+    nodes_df, edges_df = timer.run("dictionary_build", len(taxonomy_df),
+                                   make_age_compatable_df, taxonomy_df, popularity_df)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            timer.run("export_csv", len(nodes_df) + len(edges_df), export_age_csv, nodes_df, edges_df)
+        finally:
+            os.chdir(cwd)
+
+    if use_db:
+        connect = lambda: psycopg2.connect(**DB_PARAMS)
+        timer.run("node_load", len(nodes_df), load_nodes, connect, nodes_df)
+        timer.run("edge_load", len(edges_df), load_edges, connect, edges_df, edge_workers)
+        if compare_bulk:
+            connect = bulk_connect(connect)
+            timer.run("bulk_node_load", len(nodes_df), load_nodes, connect, nodes_df, bulk=True)
+            timer.run("bulk_edge_load", len(edges_df), load_edges, connect, edges_df, edge_workers)
+            timer.run("bulk_set_logged", len(nodes_df) + len(edges_df), set_logged, connect)
+        if not keep_graph:
+            conn = connect()
+            conn.autocommit = True
+            drop_graph(conn.cursor(), BENCH_GRAPH)
+            conn.close()
+
+    result = {
+        "nodes": len(nodes_df),
+        "edges": len(edges_df),
+        "edge_workers": edge_workers,
+        "stages": timer.stages,
+    }
+    if use_db and compare_bulk:
+        normal = stage_seconds(timer.stages, ("node_load", "edge_load"))
+        bulk = stage_seconds(timer.stages, ("bulk_node_load", "bulk_edge_load", "bulk_set_logged"))
+        result["bulk_time_saved_s"] = round(normal - bulk, 3)
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Times every import stage on a synthetic taxonomy and prints the results as JSON"
+    )
+    parser.add_argument("scale", help="number of generated edges, e.g. 100k, 1M, 10M")
+    parser.add_argument("--data-dir", default=None, help="keep the generated files here instead of a temp dir")
+    parser.add_argument("--no-db", action="store_true", help="skip the node/edge load stages")
+    parser.add_argument("--edge-workers", type=int, default=1)
+    parser.add_argument("--compare-bulk", action="store_true",
+                        help="load a second time in bulk mode and report the time it saves")
+    parser.add_argument("--keep-graph", action="store_true", help=f"don't drop {BENCH_GRAPH} after the run")
+    parser.add_argument("--output", default=None, help="also write the JSON result to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = args.data_dir or tmp
+        with contextlib.redirect_stdout(sys.stderr):
+            generate(parse_scale(args.scale), data_dir)
+        result = run(data_dir, not args.no_db, args.edge_workers, args.keep_graph, args.compare_bulk)
+
+    result["scale"] = args.scale
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
@@ -0,0 +1,103 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dbcli
+from dbcli import id_range, keyset_pages
+from graph_client import GraphClient
+
+
+def timed(client, query, params=None):
+    start = time.perf_counter()
+    client.query(query, params)
+    return time.perf_counter() - start
+
+
+def skip_page_query(offset, page_size):
+    return f"""
+        SELECT * FROM cypher('iw_graph', $$
+            MATCH (n:Category)
+            WITH n
+            ORDER BY id(n)
+            SKIP {offset}
+            LIMIT {page_size}
+            RETURN count(n)
+        $$) AS (page_nodes agtype);
+    """
+
+
+def keyset_page_query(lower_id, upper_id):
+    # The page of the scan tasks: a range on the graphid column of the label table
+    predicate, params = id_range("c.id", lower_id, upper_id)
+    return f"""
+        SELECT count(*) AS page_nodes FROM iw_graph."Category" c
+        WHERE {predicate};
+    """, params
+
+
+def explain_page(client, lower_id, upper_id):
+    """Plan of one keyset page; it must read the page through the index, not scan the label table"""
+    query, params = keyset_page_query(lower_id, upper_id)
+    plan = "\n".join(row[0] for row in client.query(f"EXPLAIN {query}", params))
+    if "Index" not in plan or "Seq Scan" in plan:
+        raise AssertionError(f"The keyset page is not read through an index scan:\n{plan}")
+    return plan
+
+
+def summary(latencies):
+    return {
+        "pages": len(latencies),
+        "first_page_s": round(latencies[0], 4) if latencies else None,
+        "last_page_s": round(latencies[-1], 4) if latencies else None,
+        "last_to_first": round(latencies[-1] / latencies[0], 2) if latencies and latencies[0] > 0 else None,
+        "total_s": round(sum(latencies), 3),
+        "page_s": [round(seconds, 4) for seconds in latencies],
+    }
+
+
+def run(client, page_size, max_pages=None, skip=True):
+    # The boundary scan is part of the keyset cost, so it's timed and spread over the pages
+    start = time.perf_counter()
+    pages = keyset_pages(page_size=page_size)
+    boundary_s = (time.perf_counter() - start) / max(len(pages), 1)
+    pages = pages[:max_pages] if max_pages else pages
+
+    # A page in the middle of the scan, so both ends of its range are bound
+    result = {"page_size": page_size, "keyset_plan": explain_page(client, *pages[len(pages) // 2]).splitlines()}
+    result["keyset"] = summary([
+        boundary_s + timed(client, *keyset_page_query(lower_id, upper_id)) for lower_id, upper_id in pages
+    ])
+    if skip:
+        result["skip_limit"] = summary([
+            timed(client, skip_page_query(i * page_size, page_size)) for i in range(len(pages))
+        ])
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Times every page of a full scan of iw_graph with keyset pagination and with SKIP/LIMIT, "
+                    "prints the per-page latencies as JSON"
+    )
+    parser.add_argument("--page-size", type=int, default=dbcli.PAGE_SIZE)
+    parser.add_argument("--max-pages", type=int, default=None, help="only time the first N pages")
+    parser.add_argument("--no-skip", action="store_true", help="don't time the SKIP/LIMIT pages")
+    parser.add_argument("--output", default=None, help="also write the JSON result to this file")
+    args = parser.parse_args()
+
+    client = GraphClient(dbcli.DB_PARAMS)
+    dbcli.graph_client = client
+    try:
+        result = run(client, args.page_size, args.max_pages, not args.no_skip)
+    finally:
+        client.close()
+
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
@@ -0,0 +1,56 @@
+import gzip
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from import_v3 import parse_taxonomy, parse_taxonomy_per_line
+
+NUM_LINES = 1_000_000
+QUOTED_SHARE = 0.01
+
+
+def random_name(rng):
+    name = "_".join(rng.choice(["History", "Science", "People", "Art", "Music", "Sport", "of", "in"])
+                    for _ in range(rng.randint(2, 6)))
+    if rng.random() < QUOTED_SHARE:
+        return f'"{name},_{rng.randint(1, 1000)}"'
+    return f"{name}_{rng.randint(1, 100000)}"
+
+
+def write_synthetic_taxonomy(path, num_lines, seed=0):
+    rng = random.Random(seed)
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        for _ in range(num_lines):
+            f.write(f"{random_name(rng)},{random_name(rng)}\n")
+
+
+def timed(fn, path):
+    start = time.perf_counter()
+    df = fn(path)
+    return df, time.perf_counter() - start
+
+
+def main(num_lines=NUM_LINES):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "taxonomy_synthetic.csv.gz")
+        write_synthetic_taxonomy(path, num_lines)
+        print(f"Synthetic taxonomy: {num_lines} lines, {os.path.getsize(path) / 1e6:.1f} MB gzipped")
+
+        old_df, old_time = timed(parse_taxonomy_per_line, path)
+        new_df, new_time = timed(parse_taxonomy, path)
+
+        if not old_df.equals(new_df):
+            print("ERROR: parsers returned different data")
+            sys.exit(1)
+
+        print(f"per-line parser: {old_time:.2f} s ({num_lines / old_time:,.0f} lines/s)")
+        print(f"chunked parser:  {new_time:.2f} s ({num_lines / new_time:,.0f} lines/s)")
+        print(f"speedup: {old_time / new_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else NUM_LINES)
@@ -0,0 +1,92 @@
+import contextlib
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import parse_cache
+from import_v3 import make_age_compatable_df, parse_popularity, parse_taxonomy
+from scripts.generate_taxonomy import generate, parse_scale, write_lines
+
+# Parser version the checked frames are stored under in the parse cache; they come back as the
+# dictionary encoded columns import_v3 gets from it
+CHECK_PARSER_VERSION = 0
+
+
+def edge_name_pairs(nodes_df, edges_df):
+    names = nodes_df['name'].to_numpy(dtype=object)
+    return list(zip(names[edges_df['start_id'].to_numpy() - 1], names[edges_df['end_id'].to_numpy() - 1]))
+
+
+def as_objects(df):
+    return df.apply(lambda column: column.astype(object) if isinstance(column.dtype, pd.CategoricalDtype) else column)
+
+
+def through_cache(path, df):
+    # String columns come back dictionary encoded, with codes as narrow as the number of names allows
+    parse_cache.store(path, CHECK_PARSER_VERSION, df)
+    return parse_cache.load(path, CHECK_PARSER_VERSION)
+
+
+def check(label, taxonomy_df, popularity_df):
+    """The dictionary of the cached (Categorical) frames must give the same edges and popularity as the object frames"""
+    expected = list(zip(taxonomy_df['from'].astype(object), taxonomy_df['to'].astype(object)))
+    results = {}
+    for kind, (taxonomy, popularity) in {
+        "object": (as_objects(taxonomy_df), as_objects(popularity_df)),
+        "categorical": (taxonomy_df, popularity_df),
+    }.items():
+        with contextlib.redirect_stdout(sys.stderr):
+            nodes_df, edges_df = make_age_compatable_df(taxonomy.copy(), popularity.copy())
+        results[kind] = nodes_df
+        pairs = edge_name_pairs(nodes_df, edges_df)
+        if pairs != expected:
+            wrong = sum(a != b for a, b in zip(pairs, expected))
+            print(f"ERROR [{label}, {kind}]: {wrong} of {len(expected)} edges have the wrong (from, to) names")
+            return False
+        if nodes_df['popularity'].isna().any():
+            print(f"ERROR [{label}, {kind}]: NaN popularity in nodes_df")
+            return False
+
+    popularity = [nodes_df.set_index('name')['popularity'].sort_index() for nodes_df in results.values()]
+    if not popularity[0].equals(popularity[1]):
+        print(f"ERROR [{label}]: object and categorical input give different popularity")
+        return False
+    print(f"[{label}] OK: {len(expected)} edges, codes {taxonomy_df['to'].cat.codes.dtype}")
+    return True
+
+
+def main(scale="100k"):
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            with contextlib.redirect_stdout(sys.stderr):
+                taxonomy_path, popularity_path = generate(parse_scale(scale), tmp)
+            taxonomy_df = through_cache(taxonomy_path, parse_taxonomy(taxonomy_path))
+            popularity_df = through_cache(popularity_path, parse_popularity(popularity_path))
+            ok &= check(f"generated {scale}", taxonomy_df, popularity_df)
+
+            # Fewer than 128 names give int8 codes; one name has no page views
+            names = [f"Category_{i}" for i in range(100)]
+            rng = np.random.default_rng(0)
+            small_taxonomy = os.path.join(tmp, "small_taxonomy.csv.gz")
+            small_popularity = os.path.join(tmp, "small_popularity.csv.gz")
+            write_lines(small_taxonomy, [f"{a},{b}" for a, b in zip(rng.choice(names, 500), rng.choice(names, 500))])
+            write_lines(small_popularity, [f"{names[0]},"] + [f"{name},{i}" for i, name in enumerate(names[1:], 1)])
+            ok &= check("small, int8 codes",
+                        through_cache(small_taxonomy, parse_taxonomy(small_taxonomy)),
+                        through_cache(small_popularity, parse_popularity(small_popularity)))
+        finally:
+            os.chdir(cwd)
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else "100k")
@@ -0,0 +1,102 @@
+import argparse
+import gzip
+import os
+
+import numpy as np
+
+WORDS = ["History", "Science", "People", "Art", "Music", "Sport", "Films", "Books", "Cities", "Rivers",
+         "Politics", "Software", "Animals", "Plants", "Albums", "Songs", "Wars", "Kings", "of", "in", "by"]
+
+# Average number of edges per node, about what the Wikipedia taxonomy has
+EDGES_PER_NODE = 3
+
+# Exponent of the Zipf law the out-degree of the categories follows
+OUT_DEGREE_EXPONENT = 0.9
+
+# Share of names quoted because they contain a comma, and of names with ' or $ (cleaned on import)
+QUOTED_SHARE = 0.01
+SPECIAL_CHAR_SHARE = 0.005
+
+# Share of edges that also get the reversed edge, which closes a cycle
+CYCLE_SHARE = 0.001
+
+# Share of nodes that have a line in the popularity file
+POPULARITY_SHARE = 0.8
+
+
+def parse_scale(value):
+    """'100k' -> 100000, '10M' -> 10000000"""
+    multipliers = {"k": 1_000, "m": 1_000_000}
+    suffix = value[-1].lower()
+    if suffix in multipliers:
+        return int(float(value[:-1]) * multipliers[suffix])
+    return int(value)
+
+
+def make_names(num_nodes, rng):
+    words = np.array(WORDS, dtype=object)
+    picks = rng.integers(0, len(words), size=(num_nodes, 3))
+    names = np.array([f"{words[a]}_{words[b]}_{words[c]}_{i}" for i, (a, b, c) in enumerate(picks)], dtype=object)
+
+    special = rng.random(num_nodes) < SPECIAL_CHAR_SHARE
+    names[special] = [f"{name}'s_$" for name in names[special]]
+    quoted = rng.random(num_nodes) < QUOTED_SHARE
+    names[quoted] = [f"{name},_and_more" for name in names[quoted]]
+    return names, quoted
+
+
+def make_edges(num_edges, num_nodes, rng):
+    # Power-law out-degree: a few hub categories get most of the children
+    weights = np.arange(1, num_nodes + 1, dtype=np.float64) ** -OUT_DEGREE_EXPONENT
+    parents = rng.choice(num_nodes, size=num_edges, p=weights / weights.sum())
+    parents = rng.permutation(num_nodes)[parents]
+    children = rng.integers(0, num_nodes, size=num_edges)
+
+    back = rng.random(num_edges) < CYCLE_SHARE
+    parents, children = np.concatenate([parents, children[back]]), np.concatenate([children, parents[back]])
+    keep = parents != children
+    return parents[keep], children[keep]
+
+
+def csv_names(names, quoted):
+    out = names.copy()
+    out[quoted] = [f'"{name}"' for name in names[quoted]]
+    return out
+
+
+def write_lines(path, lines):
+    with gzip.open(path, "wt", encoding="utf-8", compresslevel=1) as f:
+        f.write("\n".join(lines))
+        f.write("\n")
+
+
+def generate(num_edges, out_dir=".", seed=0):
+    """Writes taxonomy_iw.csv.gz and popularity_iw.csv.gz with num_edges synthetic edges into out_dir"""
+    rng = np.random.default_rng(seed)
+    num_nodes = max(num_edges // EDGES_PER_NODE, 2)
+    names, quoted = make_names(num_nodes, rng)
+    parents, children = make_edges(num_edges, num_nodes, rng)
+    written = csv_names(names, quoted)
+
+    os.makedirs(out_dir, exist_ok=True)
+    taxonomy_path = os.path.join(out_dir, "taxonomy_iw.csv.gz")
+    write_lines(taxonomy_path, written[parents] + "," + written[children])
+
+    with_popularity = np.flatnonzero(rng.random(num_nodes) < POPULARITY_SHARE)
+    views = rng.lognormal(mean=3, sigma=2, size=len(with_popularity)).astype(np.int64)
+    popularity_path = os.path.join(out_dir, "popularity_iw.csv.gz")
+    write_lines(popularity_path, written[with_popularity] + "," + views.astype(str).astype(object))
+
+    print(f"Generated {len(parents)} edges over {num_nodes} nodes "
+          f"({len(with_popularity)} with popularity) in {out_dir}")
+    return taxonomy_path, popularity_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generates a synthetic taxonomy_iw/popularity_iw pair")
+    parser.add_argument("scale", help="number of edges, e.g. 100k, 1M, 10M")
+    parser.add_argument("--out-dir", default=".", help="directory the .csv.gz files are written to")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    generate(parse_scale(args.scale), args.out_dir, args.seed)
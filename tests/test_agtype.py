@@ -0,0 +1,42 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import agtype
+
+
+def agtype_text(value):
+    return None if value is None else json.dumps(value, ensure_ascii=False)
+
+
+@pytest.mark.parametrize("values", [
+    [],
+    ["Physics"],
+    ["Physics", "Rock 'n' roll", "$100", "", "Zürich"],
+    ['Say "hi"', "back\\\\slash", "line\nbreak", "plain"],
+    ['"', '""', "a\"\nb", "x"],
+])
+def test_decode_strings_of_a_string_column(values):
+    assert agtype.decode_strings([agtype_text(value) for value in values]) == values
+
+
+@pytest.mark.parametrize("values", [
+    [None],
+    ["first", None, "last"],
+    [None, "first", "last"],
+    ["first", "last", None],
+    ["a", 1, "b", 2.5],
+    ["a", True, "b"],
+    ["a", ["b", "c"], {"d": "e"}, "f"],
+    ['esc"aped', None, "b"],
+])
+def test_decode_strings_of_a_column_with_nulls_and_other_values(values):
+    # SQL NULLs arrive as None, agtype nulls as the text null; both decode to None
+    sql_nulls = [agtype_text(value) for value in values]
+    agtype_nulls = ["null" if value is None else agtype_text(value) for value in values]
+    assert agtype.decode_strings(sql_nulls) == values
+    assert agtype.decode_strings(agtype_nulls) == values
@@ -0,0 +1,113 @@
+import bisect
+import functools
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import psycopg2
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import copy_loader
+import dbcli
+from graph_client import GraphClient
+from import_v3 import DB_PARAMS
+
+# Scratch database the fixture graph is loaded into; iw_graph in it is dropped and recreated.
+# Without it the tests that need a database are skipped
+TEST_DB_NAME = os.getenv("TEST_DB_NAME")
+
+# Small pages, so that the scan tasks go through several of them
+FIXTURE_PAGE_SIZE = 7
+
+
+def boundaries(ids, page_size):
+    """next_boundary of keyset_pages over a sorted id column"""
+    def next_boundary(lower_id):
+        position = bisect.bisect_right(ids, lower_id) + page_size - 1
+        return ids[position] if position < len(ids) else None
+    return next_boundary
+
+
+@pytest.mark.parametrize("num_ids, page_size", [(0, 3), (1, 3), (2, 3), (3, 3), (9, 3), (10, 3), (5, 1)])
+def test_page_ranges_cover_every_id_once(num_ids, page_size):
+    ids = list(range(5, 5 + 2 * num_ids, 2))
+    pages = dbcli.page_ranges(boundaries(ids, page_size))
+
+    assert pages[0][0] == 0
+    assert pages[-1][1] is None
+    assert all(upper is not None for _, upper in pages[:-1])
+    # Consecutive ranges share their boundary
+    assert all(upper == lower for (_, upper), (lower, _) in zip(pages, pages[1:]))
+    in_pages = [[i for i in ids if i > lower and (upper is None or i <= upper)] for lower, upper in pages]
+    assert sum(in_pages, []) == ids
+    assert all(len(page) == page_size for page in in_pages[:-1])
+    # A full last page is followed by an empty open one
+    assert len(in_pages[-1]) == len(ids) % page_size
+
+
+def test_id_range_compares_the_graphid_column():
+    predicate, params = dbcli.id_range("c.id", 10, 20)
+    assert predicate == "c.id > %s::text::ag_catalog.graphid AND c.id <= %s::text::ag_catalog.graphid"
+    assert params == ("10", "20")
+
+
+def test_id_range_of_the_last_page_is_open():
+    predicate, params = dbcli.id_range("h.start_id", 30, None)
+    assert predicate == "h.start_id > %s::text::ag_catalog.graphid"
+    assert params == ("30",)
+
+
+def fixture_graph():
+    """Roots, nodes with one and with several children, a cycle, a leaf and names with ' and $"""
+    rng = np.random.default_rng(0)
+    names = [f"Category_{i}" for i in range(40)] + ["Rock 'n' roll", "$100", "Category_0 "]
+    edges = {(int(a), int(b)) for a, b in zip(rng.integers(1, 30, 60), rng.integers(5, len(names) + 1, 60))}
+    edges |= {(41, 42), (42, 41), (43, 43)}
+    edges = sorted((a, b) for a, b in edges)
+    nodes_df = pd.DataFrame({
+        'id': np.arange(1, len(names) + 1, dtype=np.int64),
+        'name': names,
+        'popularity': rng.integers(0, 100, len(names)).astype(np.float64),
+    })
+    edges_df = pd.DataFrame(edges, columns=['start_id', 'end_id'])
+    return nodes_df, edges_df
+
+
+@pytest.fixture(scope="module")
+def loaded_graph():
+    if not TEST_DB_NAME:
+        pytest.skip("TEST_DB_NAME is not set")
+    params = {**DB_PARAMS, "dbname": TEST_DB_NAME}
+
+    conn = psycopg2.connect(**params)
+    conn.autocommit = True
+    with conn.cursor() as cursor:
+        cursor.execute("LOAD 'age';")
+        cursor.execute("SET search_path TO ag_catalog;")
+        cursor.execute("SELECT count(*) FROM ag_catalog.ag_graph WHERE name = %s;", (copy_loader.GRAPH_NAME,))
+        if cursor.fetchone()[0]:
+            cursor.execute("SELECT drop_graph(%s, true);", (copy_loader.GRAPH_NAME,))
+    conn.close()
+    copy_loader.copy_graph(lambda: psycopg2.connect(**params), *fixture_graph())
+
+    client = GraphClient(params)
+    saved_client = dbcli.graph_client
+    dbcli.graph_client = client
+    yield client
+    dbcli.graph_client = saved_client
+    client.close()
+
+
+@pytest.mark.parametrize("task_number", [7, 8, 9, 11])
+def test_cypher_and_sql_forms_print_the_same_rows(loaded_graph, monkeypatch, task_number):
+    monkeypatch.setattr(dbcli, "keyset_pages", functools.partial(dbcli.keyset_pages, page_size=FIXTURE_PAGE_SIZE))
+    failed_before = dbcli.failed_queries
+
+    outputs, _ = dbcli.form_outputs(task_number)
+
+    assert dbcli.failed_queries == failed_before
+    assert outputs["cypher"]
+    assert outputs["cypher"] == outputs["sql"]
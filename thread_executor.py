@@ -0,0 +1,25 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from tqdm import tqdm
+
+
+def run_concurrently(client, calls, concurrency=4, desc=None):
+    """Runs every (fn, *args) of calls on worker threads, at most `concurrency` at a time, and
+    returns their results in the order of calls
+
+    This only offloads blocking psycopg2 calls to threads, the queries themselves stay synchronous.
+    psycopg2 releases the GIL while it waits for the server and every call borrows its own
+    connection from the GraphClient pool, so the queries still overlap on the server.
+    """
+    # The pool raises instead of waiting when it runs out of connections
+    workers = max(1, min(concurrency, client.max_connections))
+
+    def run(call):
+        fn, *args = call
+        result = fn(*args)
+        bar.update(1)
+        return result
+
+    with tqdm(total=len(calls), desc=desc, disable=desc is None) as bar:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(run, calls))